@@ -0,0 +1,387 @@
+"""Кеш в файле, отображённом в память, общий для всех процессов хоста.
+
+``LOCATION`` — путь к файлу. Файл состоит из заголовка, хеш-таблицы на
+``SLOTS`` записей с открытой адресацией и области данных размером
+``SIZE`` байт. Запись таблицы хранит хеш ключа, место значения в
+области данных, срок жизни и время последнего чтения; в области данных
+лежит сам ключ (для сверки при совпадении хешей) и pickle значения.
+
+Новые значения дописываются в конец занятой части области данных.
+Когда место в конце кончается, вытесняются записи, которые дольше всех
+не читали (просроченные — в первую очередь), пока живые данные не
+займут не больше ``1 - EVICT_SHARE`` области, а оставшиеся значения
+сдвигаются к началу. Так дорогой проход по всей таблице случается раз
+на много записей, а не на каждую. Значения больше ``MAX_ENTRY`` байт
+не кешируются, чтобы одна запись не вытеснила всё.
+
+Процессы синхронизируются блокировкой ``flock`` на файле: чтение берёт
+разделяемую, изменение — исключительную; внутри процесса потоки
+дополнительно сериализуются обычной блокировкой, так как ``flock`` не
+различает потоки. Время чтения для LRU обновляется под разделяемой
+блокировкой: это одно выровненное 8-байтовое поле, и гонка двух
+читателей безвредна. Дескриптор и отображение файла одни на процесс и
+``LOCATION`` (Django создаёт по экземпляру бэкенда на поток), поэтому
+``close()`` ничего не закрывает.
+
+В файле лежат pickle-данные, а распаковка чужого pickle — выполнение
+чужого кода. Поэтому каталог файла должен принадлежать пользователю
+процесса и быть закрыт на запись для остальных, сам файл — не
+доступен никому, кроме владельца; иначе ``ImproperlyConfigured``.
+Значение, которое не удалось распаковать, считается промахом.
+"""
+import fcntl
+import hashlib
+import mmap
+import os
+import pickle
+import struct
+import threading
+import time
+from contextlib import contextmanager
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.exceptions import ImproperlyConfigured
+
+MAGIC = b'YTC1'
+# Сигнатура, число записей, размер данных, живые записи, удалённые
+# записи, конец занятой части данных
+HEADER = struct.Struct('<4sIQIIQ')
+HEADER_SIZE = 64
+# Хеш, смещение, длина, длина ключа, истекает, последнее чтение
+RECORD = struct.Struct('<QQIIdd')
+ACCESSED = struct.Struct('<d')
+ACCESSED_OFFSET = 32
+EMPTY, DELETED = 0, 1
+# Доля области данных, освобождаемая за одно вытеснение
+EVICT_SHARE = 1 / 8
+
+
+# (pid, путь) -> открытый файл кеша
+_files = {}
+_files_lock = threading.Lock()
+
+
+class SharedFile:
+    """Дескриптор и отображение файла кеша, общие для потоков процесса."""
+
+    def __init__(self, fd, mapped):
+        self.fd = fd
+        self.map = mapped
+        # flock не различает потоки одного дескриптора
+        self.lock = threading.Lock()
+
+
+def _check_owner(stat, path, private):
+    # Каталог закрыт на запись для чужих, файл — и на чтение
+    mask = 0o077 if private else 0o022
+    if stat.st_uid != os.getuid() or stat.st_mode & mask:
+        raise ImproperlyConfigured(
+            f'{path} must be owned by uid {os.getuid()} and not '
+            f'{"accessible" if private else "writable"} by other users'
+        )
+
+
+def open_shared(path, slots, size):
+    """Открыть файл кеша один раз на процесс; после fork — заново."""
+    key = (os.getpid(), path)
+    data = HEADER_SIZE + slots * RECORD.size
+    total = data + size
+    with _files_lock:
+        shared = _files.get(key)
+        if shared is not None:
+            if len(shared.map) != total:
+                raise ImproperlyConfigured(
+                    f'{path} is used by caches with different SIZE or SLOTS'
+                )
+            return shared
+        directory = os.path.dirname(path) or '.'
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        _check_owner(os.stat(directory), directory, private=False)
+        fd = os.open(
+            path, os.O_RDWR | os.O_CREAT | os.O_NOFOLLOW | os.O_CLOEXEC,
+            0o600,
+        )
+        try:
+            _check_owner(os.fstat(fd), path, private=True)
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                if os.fstat(fd).st_size != total:
+                    os.ftruncate(fd, total)
+                mapped = mmap.mmap(fd, total)
+                magic, *params = HEADER.unpack_from(mapped, 0)[:3]
+                if (magic, *params) != (MAGIC, slots, size):
+                    # Новый файл или файл с другой разметкой
+                    mapped[HEADER_SIZE:data] = bytes(data - HEADER_SIZE)
+                    HEADER.pack_into(mapped, 0, MAGIC, slots, size, 0, 0, 0)
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+        except BaseException:
+            os.close(fd)
+            raise
+        shared = _files[key] = SharedFile(fd, mapped)
+        return shared
+
+
+def digest(key):
+    value = int.from_bytes(
+        hashlib.blake2b(key, digest_size=8).digest(), 'little'
+    )
+    # 0 и 1 заняты под пустые и удалённые записи
+    return value if value > DELETED else value + 2
+
+
+class MmapCache(BaseCache):
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.path = location
+        self.slots = int(options.get('SLOTS', 16384))
+        self.size = int(options.get('SIZE', 64 * 1024 * 1024))
+        self.max_entry = int(options.get('MAX_ENTRY', self.size // 8))
+        self.data = HEADER_SIZE + self.slots * RECORD.size
+
+    # Файл и блокировки
+
+    @contextmanager
+    def locked(self, exclusive=True):
+        shared = open_shared(self.path, self.slots, self.size)
+        with shared.lock:
+            self.map = shared.map
+            fcntl.flock(
+                shared.fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH
+            )
+            try:
+                yield
+            finally:
+                fcntl.flock(shared.fd, fcntl.LOCK_UN)
+
+    def reset(self):
+        self.map[HEADER_SIZE:self.data] = bytes(self.data - HEADER_SIZE)
+        self.write_header(0, 0, 0)
+
+    def header(self):
+        """Живые записи, удалённые записи и конец занятых данных."""
+        return HEADER.unpack_from(self.map, 0)[3:]
+
+    def write_header(self, live, dead, top):
+        HEADER.pack_into(
+            self.map, 0, MAGIC, self.slots, self.size, live, dead, top
+        )
+
+    # Хеш-таблица
+
+    def record(self, index):
+        return RECORD.unpack_from(self.map, HEADER_SIZE + index * RECORD.size)
+
+    def write_record(self, index, *fields):
+        RECORD.pack_into(self.map, HEADER_SIZE + index * RECORD.size, *fields)
+
+    def find(self, key):
+        """Номер записи ключа (или None) и первая свободная запись."""
+        hashed = digest(key)
+        free = None
+        start = hashed % self.slots
+        for step in range(self.slots):
+            index = (start + step) % self.slots
+            record = self.record(index)
+            if record[0] == EMPTY:
+                return None, index if free is None else free
+            if record[0] == DELETED:
+                if free is None:
+                    free = index
+                continue
+            if record[0] == hashed and record[3] == len(key):
+                offset = self.data + record[1]
+                if self.map[offset:offset + len(key)] == key:
+                    return index, free
+        return None, free
+
+    def lookup(self, key):
+        """Номер живой записи ключа и сама запись."""
+        index, _ = self.find(key)
+        if index is None:
+            return None, None
+        record = self.record(index)
+        if record[4] and record[4] <= time.time():
+            return None, None
+        return index, record
+
+    def value(self, record):
+        start = self.data + record[1]
+        return self.map[start + record[3]:start + record[2]]
+
+    def remove(self, index):
+        self.write_record(index, DELETED, 0, 0, 0, 0.0, 0.0)
+        live, dead, top = self.header()
+        self.write_header(live - 1, dead + 1, top)
+
+    def live_records(self):
+        records = struct.iter_unpack(
+            RECORD.format, self.map[HEADER_SIZE:self.data]
+        )
+        return [
+            (index, record) for index, record in enumerate(records)
+            if record[0] > DELETED
+        ]
+
+    def evict(self, records, count=0, used=None):
+        """Вытеснить ``count`` записей или данные сверх ``used`` байт."""
+        now = time.time()
+        # Сначала просроченные, затем давно не читанные
+        records.sort(key=lambda item: (
+            not (item[1][4] and item[1][4] <= now), item[1][5]
+        ))
+        total = sum(record[2] for _, record in records)
+        evicted = 0
+        for index, record in records:
+            if evicted >= count and (used is None or total <= used):
+                break
+            self.remove(index)
+            total -= record[2]
+            evicted += 1
+        return records[evicted:]
+
+    def rehash(self, records):
+        """Переложить живые записи заново, убрав удалённые."""
+        self.map[HEADER_SIZE:self.data] = bytes(self.data - HEADER_SIZE)
+        for record in records:
+            index = record[0] % self.slots
+            while self.record(index)[0] != EMPTY:
+                index = (index + 1) % self.slots
+            self.write_record(index, *record)
+
+    # Область данных
+
+    def compact(self, length):
+        """Освободить место в конце: вытеснение по LRU и уплотнение."""
+        records = self.evict(
+            self.live_records(),
+            used=min(self.size * (1 - EVICT_SHARE), self.size - length),
+        )
+        records.sort(key=lambda item: item[1][1])
+        position = 0
+        moved = []
+        for _, record in records:
+            offset, size = record[1], record[2]
+            if offset != position:
+                self.map.move(
+                    self.data + position, self.data + offset, size
+                )
+            moved.append((record[0], position, *record[2:]))
+            position += size
+        self.rehash(moved)
+        self.write_header(len(moved), 0, position)
+
+    def store(self, key, pickled, timeout):
+        """Записать значение; False, если оно не помещается."""
+        entry = key + pickled
+        index, _ = self.find(key)
+        if index is not None:
+            self.remove(index)
+        if len(entry) > self.max_entry:
+            return False
+        live, dead, top = self.header()
+        if live >= self.slots * 3 // 4:
+            self.evict(
+                self.live_records(), count=live - self.slots * 3 // 4 + 1
+            )
+            live, dead, top = self.header()
+        if self.size - top < len(entry) or live + dead >= self.slots * 9 // 10:
+            self.compact(len(entry))
+            live, dead, top = self.header()
+        self.map[self.data + top:self.data + top + len(entry)] = entry
+        _, free = self.find(key)
+        if self.record(free)[0] == DELETED:
+            dead -= 1
+        self.write_record(
+            free, digest(key), top, len(entry), len(key),
+            self.get_backend_timeout(timeout) or 0.0, time.time(),
+        )
+        self.write_header(live + 1, dead, top + len(entry))
+        return True
+
+    # API кеша Django
+
+    @staticmethod
+    def loads(pickled, default=None):
+        try:
+            return pickle.loads(pickled)
+        except Exception:
+            # Битая или чужая запись — промах, а не ошибка запроса
+            return default
+
+    def encode(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key.encode()
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.encode(key, version)
+        pickled = pickle.dumps(value, self.pickle_protocol)
+        with self.locked():
+            if self.lookup(key)[0] is not None:
+                return False
+            return self.store(key, pickled, timeout)
+
+    def get(self, key, default=None, version=None):
+        key = self.encode(key, version)
+        with self.locked(exclusive=False):
+            index, record = self.lookup(key)
+            if index is None:
+                return default
+            pickled = self.value(record)
+            ACCESSED.pack_into(
+                self.map,
+                HEADER_SIZE + index * RECORD.size + ACCESSED_OFFSET,
+                time.time(),
+            )
+        return self.loads(pickled, default)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.encode(key, version)
+        pickled = pickle.dumps(value, self.pickle_protocol)
+        with self.locked():
+            self.store(key, pickled, timeout)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.encode(key, version)
+        with self.locked():
+            index, record = self.lookup(key)
+            if index is None:
+                return False
+            expires = self.get_backend_timeout(timeout) or 0.0
+            self.write_record(index, *record[:4], expires, record[5])
+            return True
+
+    def incr(self, key, delta=1, version=None):
+        key = self.encode(key, version)
+        with self.locked():
+            index, record = self.lookup(key)
+            value = None if index is None else self.loads(self.value(record))
+            if value is None:
+                raise ValueError(f"Key '{key.decode()}' not found")
+            value += delta
+            expires = record[4]
+            self.store(
+                key, pickle.dumps(value, self.pickle_protocol),
+                expires - time.time() if expires else None,
+            )
+        return value
+
+    def has_key(self, key, version=None):
+        key = self.encode(key, version)
+        with self.locked(exclusive=False):
+            return self.lookup(key)[0] is not None
+
+    def delete(self, key, version=None):
+        key = self.encode(key, version)
+        with self.locked():
+            index, _ = self.find(key)
+            if index is not None:
+                self.remove(index)
+
+    def clear(self):
+        with self.locked():
+            self.reset()
@@ -0,0 +1,35 @@
+"""Настройка соединений SQLite.
+
+Каждое новое соединение получает PRAGMA из ``SQLITE_PRAGMAS``. В режиме
+WAL читатели не ждут пишущего и видят последнее зафиксированное
+состояние, а ``busy_timeout`` заставляет второго пишущего подождать
+освобождения блокировки вместо ошибки «database is locked».
+``synchronous = NORMAL`` в WAL не теряет целостность при сбое
+приложения, но пропускает fsync на каждой фиксации.
+
+``atomic()`` начинает транзакцию с ``BEGIN IMMEDIATE``, а не с
+обычного ``BEGIN``. Отложенная транзакция, которая сначала читает, а
+потом пишет, получает «database is locked» сразу, без ожидания
+``busy_timeout``, если другой пишущий успел зафиксироваться после её
+чтения. Немедленная берёт блокировку записи в начале и ждёт её по
+``busy_timeout``. Цена — ``atomic()`` только для чтения тоже
+ждёт пишущих.
+"""
+from django.conf import settings
+
+
+def _begin_immediate(connection):
+    connection.cursor().execute('BEGIN IMMEDIATE')
+
+
+def configure(sender, connection, **kwargs):
+    """Обработчик ``connection_created``."""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+    # Так atomic() начинает транзакцию в SQLite (BaseDatabaseWrapper)
+    connection._start_transaction_under_autocommit = (
+        lambda: _begin_immediate(connection)
+    )
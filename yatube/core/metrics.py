@@ -0,0 +1,283 @@
+"""Сводные метрики запросов в текстовом формате Prometheus.
+
+``registry`` копит счётчики и гистограммы текущего процесса под
+блокировкой, поэтому им можно пользоваться из нескольких потоков.
+Чтобы сложить цифры всех воркеров, каждый процесс не чаще раза в
+``METRICS_FLUSH_INTERVAL`` секунд сбрасывает свой снимок в файл
+``<pid>-<случайное>.json`` каталога ``METRICS_DIR``; страница метрик
+суммирует эти файлы со своим живым состоянием. Файл процесса, которого
+уже нет, прибавляется к общему ``retired.json`` и удаляется, поэтому
+счётчики не уменьшаются после перезапуска воркеров. Файлы живых
+процессов не трогаются, сколько бы они ни простаивали. Без
+``METRICS_DIR`` метрики видны только в пределах процесса.
+"""
+import fcntl
+import json
+import os
+import threading
+import time
+import uuid
+
+from django.conf import settings
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+QUERY_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100)
+
+# Имя -> тип, описание и границы корзин для гистограмм
+METRICS = {
+    'yatube_requests_total': (
+        'counter', 'Обработанные запросы', None,
+    ),
+    'yatube_request_duration_seconds': (
+        'histogram', 'Время обработки запроса', LATENCY_BUCKETS,
+    ),
+    'yatube_request_queries': (
+        'histogram', 'SQL-запросов на запрос', QUERY_BUCKETS,
+    ),
+    'yatube_cache_hits_total': (
+        'counter', 'Попадания в кеш', None,
+    ),
+    'yatube_cache_misses_total': (
+        'counter', 'Промахи кеша', None,
+    ),
+    'yatube_lookup_cache_total': (
+        'counter', 'Поиск групп и пользователей через кеш', None,
+    ),
+    'yatube_queryset_cache_total': (
+        'counter', 'Результаты запросов ORM из кеша', None,
+    ),
+    'yatube_image_bytes_saved_total': (
+        'counter', 'Байт сэкономлено перекодированием картинок', None,
+    ),
+}
+
+
+# Сумма снимков завершившихся процессов
+RETIRED = 'retired.json'
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Процесс есть, но принадлежит другому пользователю
+        return True
+    return True
+
+
+def _merge(total, snapshot):
+    for name, labels, value in snapshot:
+        key = (name, tuple(sorted(labels.items())))
+        if isinstance(value, list):
+            current = total.setdefault(key, [0] * len(value))
+            for index, part in enumerate(value):
+                current[index] += part
+        else:
+            total[key] = total.get(key, 0) + value
+    return total
+
+
+def _read(path):
+    with open(path, encoding='utf-8') as file:
+        return json.load(file)
+
+
+def _write(path, snapshot):
+    temporary = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(temporary, 'w', encoding='utf-8') as file:
+        json.dump(snapshot, file, ensure_ascii=False)
+    # Читатели видят либо старый, либо новый файл целиком
+    os.replace(temporary, path)
+
+
+class Registry:
+    def __init__(self, directory=None, flush_interval=5):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.pid = None
+        self.path = None
+        self.lock = threading.Lock()
+        self.values = {}
+        self.flushed = 0.0
+
+    def inc(self, name, labels, amount=1):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def observe(self, name, labels, value):
+        buckets = METRICS[name][2]
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            # Счётчики по корзинам (не накопленные), сумма и число
+            state = self.values.get(key)
+            if state is None:
+                state = self.values[key] = [0] * (len(buckets) + 2)
+            for index, bound in enumerate(buckets):
+                if value <= bound:
+                    state[index] += 1
+                    break
+            state[-2] += value
+            state[-1] += 1
+
+    def snapshot(self):
+        with self.lock:
+            return [
+                [name, dict(labels),
+                 value[:] if isinstance(value, list) else value]
+                for (name, labels), value in self.values.items()
+            ]
+
+    def _own_path(self):
+        # После fork у воркера свой PID, а значит и свой файл
+        if self.pid != os.getpid():
+            self.pid = os.getpid()
+            self.path = os.path.join(
+                self.directory, f'{self.pid}-{uuid.uuid4().hex}.json'
+            )
+        return self.path
+
+    def flush(self, force=False):
+        """Записать снимок процесса в общий каталог (не слишком часто)."""
+        now = time.monotonic()
+        if not self.directory or (
+            not force and now - self.flushed < self.flush_interval
+        ):
+            return
+        self.flushed = now
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        _write(self._own_path(), self.snapshot())
+
+    def _retire(self, paths):
+        # Вызывается под блокировкой каталога: файл не сложат дважды
+        retired = os.path.join(self.directory, RETIRED)
+        try:
+            total = _merge({}, _read(retired))
+        except (OSError, ValueError):
+            total = {}
+        for path in paths:
+            try:
+                _merge(total, _read(path))
+            except (OSError, ValueError):
+                pass
+        _write(retired, [
+            [name, dict(labels), value]
+            for (name, labels), value in total.items()
+        ])
+        for path in paths:
+            os.remove(path)
+
+    def others(self):
+        """Снимки остальных процессов из общего каталога."""
+        if not self.directory or not os.path.isdir(self.directory):
+            return []
+        own = self._own_path()
+        snapshots = []
+        with open(os.path.join(self.directory, 'lock'), 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            dead = []
+            for entry in os.scandir(self.directory):
+                pid = entry.name.split('-', 1)[0]
+                if (
+                    not entry.name.endswith('.json')
+                    or entry.path == own or entry.name == RETIRED
+                ):
+                    continue
+                if pid.isdigit() and not _alive(int(pid)):
+                    dead.append(entry.path)
+                    continue
+                try:
+                    snapshots.append(_read(entry.path))
+                except (OSError, ValueError):
+                    # Файл заменили прямо во время чтения
+                    continue
+            if dead:
+                self._retire(dead)
+            try:
+                snapshots.append(_read(os.path.join(self.directory, RETIRED)))
+            except (OSError, ValueError):
+                pass
+        return snapshots
+
+    def collect(self):
+        """Сумма по всем процессам: ключ -> значение."""
+        self.flush(force=True)
+        total = {}
+        for snapshot in (self.snapshot(), *self.others()):
+            _merge(total, [
+                item for item in snapshot if item[0] in METRICS
+            ])
+        return total
+
+    def render(self):
+        """Текстовый формат экспозиции Prometheus 0.0.4."""
+        collected = self.collect()
+        lines = []
+        for name, (kind, description, buckets) in METRICS.items():
+            series = sorted(
+                (labels, value) for (metric, labels), value
+                in collected.items() if metric == name
+            )
+            lines.append(f'# HELP {name} {description}')
+            lines.append(f'# TYPE {name} {kind}')
+            for labels, value in series:
+                if kind == 'counter':
+                    lines.append(f'{name}{_labels(labels)} {_number(value)}')
+                    continue
+                cumulative = 0
+                for bound, count in zip(buckets, value):
+                    cumulative += count
+                    lines.append(
+                        f'{name}_bucket{_labels(labels, le=_number(bound))} '
+                        f'{cumulative}'
+                    )
+                # В +Inf попадает всё, в том числе выше последней границы
+                lines.append(
+                    f'{name}_bucket{_labels(labels, le="+Inf")} {value[-1]}'
+                )
+                lines.append(f'{name}_sum{_labels(labels)} '
+                             f'{_number(value[-2])}')
+                lines.append(f'{name}_count{_labels(labels)} {value[-1]}')
+        return '\n'.join(lines) + '\n'
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _labels(labels, **extra):
+    pairs = [*labels, *extra.items()]
+    if not pairs:
+        return ''
+    return '{' + ','.join(
+        '{}="{}"'.format(key, str(value).replace('\\', r'\\')
+                         .replace('"', r'\"').replace('\n', r'\n'))
+        for key, value in pairs
+    ) + '}'
+
+
+def observe_request(request, response, seconds, stats):
+    """Учесть обработанный запрос; метка — имя маршрута Django."""
+    match = getattr(request, 'resolver_match', None)
+    view = match.view_name if match else 'unresolved'
+    registry.inc('yatube_requests_total', {
+        'view': view,
+        'method': request.method,
+        'status': str(response.status_code),
+    })
+    registry.observe(
+        'yatube_request_duration_seconds', {'view': view}, seconds
+    )
+    registry.observe('yatube_request_queries', {'view': view}, stats.queries)
+    if stats.hits:
+        registry.inc('yatube_cache_hits_total', {'view': view}, stats.hits)
+    if stats.misses:
+        registry.inc(
+            'yatube_cache_misses_total', {'view': view}, stats.misses
+        )
+    registry.flush()
+
+
+registry = Registry(settings.METRICS_DIR, settings.METRICS_FLUSH_INTERVAL)
@@ -0,0 +1,189 @@
+"""Middleware проекта: замеры запросов и закрепление за основной базой.
+
+``ServerTimingMiddleware`` считает для каждого запроса время view,
+число и время SQL-запросов, время рендера шаблонов и попадания в кеш.
+Результат уходит в заголовок ``Server-Timing`` (его показывают
+инструменты разработчика браузера) и одной JSON-строкой в журнал
+``core.timing``, а с ``METRICS = True`` ещё и в сводные метрики
+(``core.metrics``). Если выключено и то и другое, middleware отключается
+при старте (``MiddlewareNotUsed``) и не стоит ничего: обёртки шаблонов
+и кеша ставятся только во включённом режиме.
+
+``ReplicaPinMiddleware`` решает, можно ли запросу читать с реплик
+(подробности в ``core.routers``).
+"""
+import json
+import logging
+import time
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.base import Template
+
+from . import metrics, routers
+
+logger = logging.getLogger('core.timing')
+
+_current = ContextVar('server_timing', default=None)
+_MISSING = object()
+
+
+class Stats:
+    def __init__(self):
+        self.queries = 0
+        self.db = 0.0
+        self.templates = 0.0
+        self.depth = 0
+        self.batch = 0
+        self.hits = 0
+        self.misses = 0
+
+
+def _timed_render(render):
+    def wrapper(self, context):
+        stats = _current.get()
+        # Вложенные {% include %} уже входят во время внешнего шаблона
+        if stats is None or stats.depth:
+            return render(self, context)
+        stats.depth += 1
+        started = time.perf_counter()
+        try:
+            return render(self, context)
+        finally:
+            stats.templates += time.perf_counter() - started
+            stats.depth -= 1
+    wrapper.server_timing = True
+    return wrapper
+
+
+def _counted_get(get):
+    def wrapper(self, key, default=None, version=None):
+        value = get(self, key, _MISSING, version)
+        stats = _current.get()
+        # BaseCache.get_many читает через get: такие ключи считает get_many
+        if stats is not None and not stats.batch:
+            if value is _MISSING:
+                stats.misses += 1
+            else:
+                stats.hits += 1
+        return default if value is _MISSING else value
+    wrapper.server_timing = True
+    return wrapper
+
+
+def _counted_get_many(get_many):
+    def wrapper(self, keys, version=None):
+        keys = list(keys)
+        stats = _current.get()
+        if stats is None:
+            return get_many(self, keys, version)
+        stats.batch += 1
+        try:
+            found = get_many(self, keys, version)
+        finally:
+            stats.batch -= 1
+        if not stats.batch:
+            stats.hits += len(found)
+            stats.misses += len(keys) - len(found)
+        return found
+    wrapper.server_timing = True
+    return wrapper
+
+
+def install():
+    """Обернуть рендер шаблонов и чтение кешей (один раз)."""
+    if not getattr(Template.render, 'server_timing', False):
+        Template.render = _timed_render(Template.render)
+    for alias in settings.CACHES:
+        backend = type(caches[alias])
+        if not getattr(backend.get, 'server_timing', False):
+            backend.get = _counted_get(backend.get)
+        if not getattr(backend.get_many, 'server_timing', False):
+            backend.get_many = _counted_get_many(backend.get_many)
+
+
+class ServerTimingMiddleware:
+    def __init__(self, get_response):
+        if not (settings.SERVER_TIMING or settings.METRICS):
+            raise MiddlewareNotUsed
+        install()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = Stats()
+        token = _current.set(stats)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(self.record_query)
+                    )
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        view = time.perf_counter() - started
+        if settings.METRICS:
+            metrics.observe_request(request, response, view, stats)
+        if not settings.SERVER_TIMING:
+            return response
+        response['Server-Timing'] = ', '.join((
+            f'view;dur={view * 1000:.1f}',
+            f'db;dur={stats.db * 1000:.1f};desc="{stats.queries} queries"',
+            f'tmpl;dur={stats.templates * 1000:.1f}',
+            f'cache;desc="{stats.hits} hits / {stats.misses} misses"',
+        ))
+        logger.info(json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'view_ms': round(view * 1000, 1),
+            'db_ms': round(stats.db * 1000, 1),
+            'queries': stats.queries,
+            'template_ms': round(stats.templates * 1000, 1),
+            'cache_hits': stats.hits,
+            'cache_misses': stats.misses,
+        }))
+        return response
+
+    @staticmethod
+    def record_query(execute, sql, params, many, context):
+        stats = _current.get()
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            if stats is not None:
+                stats.queries += 1
+                stats.db += time.perf_counter() - started
+
+
+class ReplicaPinMiddleware:
+    """Разрешает чтение с реплик в GET-запросах без свежей записи."""
+
+    def __init__(self, get_response):
+        if not settings.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        use_replicas = (
+            request.method in ('GET', 'HEAD')
+            and routers.PIN_COOKIE not in request.COOKIES
+        )
+        token = routers.begin(use_replicas)
+        try:
+            response = self.get_response(request)
+        finally:
+            state = routers.end(token)
+        if state.wrote:
+            response.set_cookie(
+                routers.PIN_COOKIE, '1',
+                max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True, samesite='Lax',
+            )
+        return response
@@ -0,0 +1,86 @@
+"""Чтение с реплик, запись в основную базу.
+
+Реплики (``DATABASE_REPLICAS``) используются только для чтения внутри
+GET- и HEAD-запросов; всё остальное — POST-запросы, команды, фоновые
+потоки и чтение внутри транзакций — идёт в ``default``. Запрос, который
+что-то записал, оставляет cookie, и следующие ``REPLICA_PIN_SECONDS``
+секунд чтения этого браузера тоже идут в основную базу: после
+редиректа на профиль или пост видно только что сохранённое, даже если
+реплика отстаёт. Сессии всегда читаются из основной базы: иначе
+только что вошедший пользователь выглядел бы анонимом до обновления
+реплики.
+
+Кеши заполняются только из основной базы (``with primary():``): запись
+сдвигает поколения сразу, а реплика может отставать, и её старые
+данные легли бы в кеш под новым поколением до следующей записи.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+PIN_COOKIE = 'primary_db'
+# Приложения, которые читаются только из основной базы
+PRIMARY_ONLY_APPS = {'sessions'}
+
+_current = ContextVar('replica_state', default=None)
+
+
+class RequestState:
+    def __init__(self, use_replicas):
+        self.use_replicas = use_replicas
+        self.wrote = False
+
+
+def begin(use_replicas):
+    """Начать запрос; вернуть токен для ``end``."""
+    return _current.set(RequestState(use_replicas))
+
+
+def end(token):
+    """Закончить запрос; вернуть его состояние."""
+    state = _current.get()
+    _current.reset(token)
+    return state
+
+
+@contextmanager
+def primary():
+    """Читать внутри блока из основной базы: результат пойдёт в кеш."""
+    state = _current.get()
+    if state is None or not state.use_replicas:
+        yield
+        return
+    state.use_replicas = False
+    try:
+        yield
+    finally:
+        state.use_replicas = True
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _current.get()
+        if (
+            state is None or not state.use_replicas or state.wrote
+            or not settings.DATABASE_REPLICAS
+            or model._meta.app_label in PRIMARY_ONLY_APPS
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return DEFAULT_DB_ALIAS
+        return random.choice(settings.DATABASE_REPLICAS)
+
+    def db_for_write(self, model, **hints):
+        state = _current.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики — копии основной базы, связи между ними допустимы
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db == DEFAULT_DB_ALIAS
@@ -0,0 +1,113 @@
+"""Кеш, который не пересчитывает одно значение во всех запросах сразу.
+
+``get_or_set`` хранит значение вместе с моментом, до которого оно
+свежее, и временем, которое занял расчёт; в кеше запись живёт ещё
+``STAMPEDE_GRACE`` секунд после этого момента.
+
+* Устаревшее значение пересчитывает только тот, кто взял блокировку
+  ``cache.add`` (она общая для потоков и процессов, если общий сам
+  кеш). Остальные, пока идёт расчёт, получают прежнее значение.
+* Незадолго до срока значение с некоторой вероятностью пересчитывается
+  заранее (XFetch): чем дольше расчёт и ближе срок, тем вероятнее.
+  Горячие ключи обновляются вразброс, а не все в одну секунду.
+* ``version`` (например, строка поколений) хранится в записи, а не в
+  ключе: после изменения данных прежняя версия тоже служит запасной,
+  пока один запрос строит новую.
+
+Если значения нет совсем, остальные ждут победителя до
+``STAMPEDE_WAIT`` секунд, а потом считают сами.
+
+Внутри ``with tracking() as stale:`` список ``stale`` непуст, если
+хотя бы одно значение было отдано устаревшим: кеш целой страницы не
+должен сохранять такой ответ под ключом новых данных.
+"""
+import contextvars
+import math
+import random
+import time
+import uuid
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache as default_cache
+
+from . import routers
+
+# Как часто, в секундах, ждущий запрос проверяет, готово ли значение
+POLL_INTERVAL = 0.05
+
+_stale = contextvars.ContextVar('stampede_stale', default=None)
+
+
+def _lock_key(key):
+    return f'{key}:recompute'
+
+
+@contextmanager
+def tracking():
+    """Отмечать ключи, отданные внутри блока устаревшими."""
+    token = _stale.set([])
+    try:
+        yield _stale.get()
+    finally:
+        _stale.reset(token)
+
+
+def _serve(key, entry, version):
+    # Досрочное обновление (XFetch) отдаёт ещё свежее значение
+    stale = _stale.get()
+    if stale is not None and (entry[1] != version or time.time() >= entry[2]):
+        stale.append(key)
+    return entry[0]
+
+
+def _fresh(entry, version, beta):
+    _, stored, expires, delta = entry
+    if stored != version:
+        return False
+    # -log(u) при u из (0, 1] — экспоненциальная случайная величина
+    early = -delta * beta * math.log(1.0 - random.random())
+    return time.time() + early < expires
+
+
+def _compute(cache, key, compute, timeout, version, grace):
+    started = time.monotonic()
+    # Значение ляжет в кеш: читать его с отстающей реплики нельзя
+    with routers.primary():
+        value = compute()
+    delta = time.monotonic() - started
+    cache.set(
+        key, (value, version, time.time() + timeout, delta), timeout + grace
+    )
+    return value
+
+
+def get_or_set(key, compute, timeout, version=None, grace=None, beta=1.0,
+               cache=None):
+    """Значение ``key`` из кеша или ``compute()`` в одном из запросов."""
+    cache = cache or default_cache
+    if grace is None:
+        grace = settings.STAMPEDE_GRACE
+    entry = cache.get(key)
+    if entry is not None and _fresh(entry, version, beta):
+        return entry[0]
+    lock = _lock_key(key)
+    token = uuid.uuid4().hex
+    deadline = time.monotonic() + settings.STAMPEDE_WAIT
+    while True:
+        if cache.add(lock, token, settings.STAMPEDE_LOCK_TIMEOUT):
+            try:
+                return _compute(cache, key, compute, timeout, version, grace)
+            finally:
+                if cache.get(lock) == token:
+                    cache.delete(lock)
+        if entry is not None:
+            return _serve(key, entry, version)
+        if time.monotonic() >= deadline:
+            break
+        time.sleep(POLL_INTERVAL)
+        entry = cache.get(key)
+        if entry is not None and entry[1] == version:
+            return entry[0]
+    # Победитель не успел или упал, не сняв блокировку
+    return _compute(cache, key, compute, timeout, version, grace)
@@ -0,0 +1,70 @@
+"""``{% fragment_cache %}`` — ``{% cache %}`` с защитой от лавины.
+
+    {% load fragment_cache %}
+    {% fragment_cache 21600 index_page page version=generation %}
+      ...
+    {% endfragment_cache %}
+
+Аргументы те же, что у ``{% cache %}``: время жизни, имя фрагмента и
+значения, от которых он зависит. Необязательные ``version=`` и
+``grace=`` передаются в ``core.stampede.get_or_set``: фрагмент старой
+версии отдаётся, пока новая отрисовывается в одном запросе.
+"""
+from django import template
+from django.core.cache.utils import make_template_fragment_key
+
+from .. import stampede
+
+register = template.Library()
+
+OPTIONS = ('version', 'grace')
+
+
+class FragmentCacheNode(template.Node):
+    def __init__(self, nodelist, timeout, name, vary_on, options):
+        self.nodelist = nodelist
+        self.timeout = timeout
+        self.name = name
+        self.vary_on = vary_on
+        self.options = options
+
+    def render(self, context):
+        try:
+            timeout = int(self.timeout.resolve(context))
+        except (template.VariableDoesNotExist, TypeError, ValueError):
+            raise template.TemplateSyntaxError(
+                f'"fragment_cache" tag got a non-integer timeout value: '
+                f'{self.timeout.var!r}'
+            )
+        key = make_template_fragment_key(
+            self.name, [var.resolve(context) for var in self.vary_on]
+        )
+        options = {
+            name: value.resolve(context)
+            for name, value in self.options.items()
+        }
+        return stampede.get_or_set(
+            key, lambda: self.nodelist.render(context), timeout, **options
+        )
+
+
+@register.tag('fragment_cache')
+def do_fragment_cache(parser, token):
+    nodelist = parser.parse(('endfragment_cache',))
+    parser.delete_first_token()
+    bits = token.split_contents()
+    options = {}
+    while bits[-1].split('=', 1)[0] in OPTIONS:
+        name, value = bits.pop().split('=', 1)
+        options[name] = parser.compile_filter(value)
+    if len(bits) < 3:
+        raise template.TemplateSyntaxError(
+            f"'{bits[0]}' tag requires at least 2 arguments."
+        )
+    return FragmentCacheNode(
+        nodelist,
+        parser.compile_filter(bits[1]),
+        bits[2],
+        [parser.compile_filter(bit) for bit in bits[3:]],
+        options,
+    )
@@ -1,6 +1,34 @@
+import itertools
+import json
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import threading
+import time
 from http import HTTPStatus
+from io import StringIO
+from unittest import mock
 
-from django.test import TestCase
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import ConnectionHandler, OperationalError, transaction
+from django.template import Context, Template
+from django.test import (SimpleTestCase, TestCase, TransactionTestCase,
+                         override_settings)
+from django.urls import reverse
+
+from . import middleware, routers, stampede
+from .cache import MmapCache
+from .metrics import Registry
+from .routers import ReplicaRouter
+
+User = get_user_model()
 
 
 class ViewTestClass(TestCase):
@@ -8,3 +36,543 @@ class ViewTestClass(TestCase):
         response = self.client.get('/nonexist-page/')
         self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
         self.assertTemplateUsed(response, 'core/404.html')
+
+
+class ServerTimingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def timing(self, response):
+        parts = response['Server-Timing'].split(', ')
+        return dict(part.split(';', 1) for part in parts)
+
+    def test_header_and_log_line(self):
+        """Ответ несёт Server-Timing, в журнал пишется строка JSON."""
+        with self.assertLogs('core.timing', 'INFO') as logs:
+            response = self.client.get(reverse('posts:index'))
+        timing = self.timing(response)
+        self.assertEqual(set(timing), {'view', 'db', 'tmpl', 'cache'})
+        self.assertRegex(timing['db'], r'dur=[\d.]+;desc="[1-9]\d* queries"')
+        record = json.loads(logs.records[-1].getMessage())
+        self.assertEqual(record['path'], reverse('posts:index'))
+        self.assertEqual(record['status'], 200)
+        self.assertGreater(record['template_ms'], 0)
+
+    def test_cache_hits_counted(self):
+        """Повторный анонимный запрос берётся из кеша и это видно."""
+        self.client.get(reverse('posts:index'))
+        response = self.client.get(reverse('posts:index'))
+        self.assertRegex(self.timing(response)['cache'], r'[1-9]\d* hits')
+
+    def test_get_many_counted_once(self):
+        """Ключи из get_many не считаются второй раз через get."""
+        middleware.install()
+        stats = middleware.Stats()
+        token = middleware._current.set(stats)
+        try:
+            cache.set('есть', 1)
+            cache.get_many(['есть', 'нет'])
+        finally:
+            middleware._current.reset(token)
+        self.assertEqual((stats.hits, stats.misses), (1, 1))
+
+    @override_settings(SERVER_TIMING=False, METRICS=False)
+    def test_disabled(self):
+        """Выключенный middleware не добавляет заголовок."""
+        response = self.client.get(reverse('posts:index'))
+        self.assertNotIn('Server-Timing', response)
+
+
+class MetricsTests(TestCase):
+    def test_staff_only(self):
+        """Страница метрик закрыта для всех, кроме staff."""
+        self.assertEqual(
+            self.client.get(reverse('metrics')).status_code,
+            HTTPStatus.FORBIDDEN,
+        )
+        self.client.force_login(User.objects.create_user(username='reader'))
+        self.assertEqual(
+            self.client.get(reverse('metrics')).status_code,
+            HTTPStatus.FORBIDDEN,
+        )
+
+    def test_request_metrics_by_view(self):
+        """Запросы попадают в метрики с именем маршрута."""
+        self.client.get(reverse('posts:index'))
+        self.client.force_login(
+            User.objects.create_user(username='admin', is_staff=True)
+        )
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        text = response.content.decode()
+        self.assertIn('# TYPE yatube_request_duration_seconds histogram', text)
+        self.assertRegex(
+            text,
+            r'yatube_requests_total\{method="GET",status="200",'
+            r'view="posts:index"\} [1-9]',
+        )
+        self.assertRegex(
+            text,
+            r'yatube_request_queries_bucket\{view="posts:index",le="\+Inf"\}'
+            r' [1-9]',
+        )
+
+
+class RegistryTests(SimpleTestCase):
+    def test_processes_are_summed(self):
+        """Снимки процессов в общем каталоге складываются."""
+        with tempfile.TemporaryDirectory() as directory:
+            first, second = Registry(directory), Registry(directory)
+            for registry in (first, second):
+                registry.inc('yatube_requests_total', {'view': 'a'})
+                registry.observe(
+                    'yatube_request_duration_seconds', {'view': 'a'}, 0.02
+                )
+            second.flush(force=True)
+            text = first.render()
+        self.assertIn('yatube_requests_total{view="a"} 2', text)
+        self.assertIn(
+            'yatube_request_duration_seconds_bucket{view="a",le="0.01"} 0',
+            text,
+        )
+        self.assertIn(
+            'yatube_request_duration_seconds_bucket{view="a",le="0.025"} 2',
+            text,
+        )
+        self.assertIn(
+            'yatube_request_duration_seconds_count{view="a"} 2', text
+        )
+
+    def test_inf_bucket_counts_everything(self):
+        """+Inf равно числу наблюдений, включая выше последней границы."""
+        registry = Registry()
+        for seconds in (0.003, 7):
+            registry.observe(
+                'yatube_request_duration_seconds', {'view': 'a'}, seconds
+            )
+        text = registry.render()
+        self.assertIn(
+            'yatube_request_duration_seconds_bucket{view="a",le="5"} 1', text
+        )
+        self.assertIn(
+            'yatube_request_duration_seconds_bucket{view="a",le="+Inf"} 2',
+            text,
+        )
+        self.assertIn(
+            'yatube_request_duration_seconds_sum{view="a"} 7.003', text
+        )
+
+    def dead_pid(self):
+        process = multiprocessing.Process(target=int)
+        process.start()
+        process.join()
+        return process.pid
+
+    def test_dead_processes_retired(self):
+        """Снимок завершившегося процесса не теряется и не дублируется."""
+        with tempfile.TemporaryDirectory() as directory:
+            dead = Registry(directory)
+            dead.inc('yatube_requests_total', {'view': 'a'}, 3)
+            dead.flush(force=True)
+            path = os.path.join(directory, f'{self.dead_pid()}-dead.json')
+            os.rename(dead.path, path)
+            reader = Registry(directory)
+            for _ in range(2):
+                self.assertIn(
+                    'yatube_requests_total{view="a"} 3', reader.render()
+                )
+            self.assertFalse(os.path.exists(path))
+
+    def test_idle_live_process_kept(self):
+        """Давно не обновлявшийся файл живого процесса не удаляется."""
+        with tempfile.TemporaryDirectory() as directory:
+            idle = Registry(directory)
+            idle.inc('yatube_requests_total', {'view': 'a'})
+            idle.flush(force=True)
+            path = os.path.join(directory, f'{os.getppid()}-idle.json')
+            os.rename(idle.path, path)
+            os.utime(path, (0, 0))
+            text = Registry(directory).render()
+            self.assertTrue(os.path.exists(path))
+        self.assertIn('yatube_requests_total{view="a"} 1', text)
+
+
+class ReplicaRouterTests(SimpleTestCase):
+    def setUp(self):
+        self.router = ReplicaRouter()
+
+    def read_alias(self, use_replicas=True, write=False):
+        token = routers.begin(use_replicas)
+        try:
+            if write:
+                self.router.db_for_write(User)
+            return self.router.db_for_read(User)
+        finally:
+            routers.end(token)
+
+    @override_settings(DATABASE_REPLICAS=['replica0'])
+    def test_reads_and_writes(self):
+        """Чтение в GET-запросе — с реплики, после записи — с основной."""
+        self.assertEqual(self.read_alias(), 'replica0')
+        self.assertEqual(self.read_alias(write=True), 'default')
+        self.assertEqual(self.read_alias(use_replicas=False), 'default')
+        token = routers.begin(True)
+        self.assertEqual(self.router.db_for_read(Session), 'default')
+        routers.end(token)
+        # Вне запроса (команды, фоновые задачи) — всегда основная база
+        self.assertEqual(self.router.db_for_read(User), 'default')
+
+    @override_settings(DATABASE_REPLICAS=['replica0'])
+    def test_cache_fills_read_primary(self):
+        """Значение для кеша читается из основной базы."""
+        token = routers.begin(True)
+        try:
+            with routers.primary():
+                self.assertEqual(self.router.db_for_read(User), 'default')
+            self.assertEqual(self.router.db_for_read(User), 'replica0')
+            computed = stampede.get_or_set(
+                'replica-test', lambda: self.router.db_for_read(User), 60,
+                cache=LocMemCache('replica-test', {}),
+            )
+            self.assertEqual(computed, 'default')
+        finally:
+            routers.end(token)
+
+
+class ReplicaPinTests(TransactionTestCase):
+    @override_settings(DATABASE_REPLICAS=['replica0'])
+    def test_write_pins_browser(self):
+        """После POST браузер получает cookie закрепления."""
+        user = User.objects.create_user(username='writer')
+        self.client.force_login(user)
+        response = self.client.post(
+            reverse('posts:create'), {'text': 'Новый пост'}
+        )
+        self.assertIn(routers.PIN_COOKIE, response.cookies)
+        self.assertEqual(
+            response.cookies[routers.PIN_COOKIE]['max-age'],
+            settings.REPLICA_PIN_SECONDS,
+        )
+
+    def test_sync_replicas_copies_primary(self):
+        """sync_replicas делает файловую копию основной базы."""
+        User.objects.create_user(username='copied')
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'replica.sqlite3')
+            call_command('sync_replicas', path, stdout=StringIO())
+            replica = sqlite3.connect(path)
+            try:
+                usernames = [row[0] for row in replica.execute(
+                    'SELECT username FROM auth_user'
+                )]
+            finally:
+                replica.close()
+        self.assertIn('copied', usernames)
+
+
+class SQLiteConcurrencyTests(SimpleTestCase):
+    """Отдельная файловая база: WAL не работает в памяти."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.handlers = []
+        self.path = os.path.join(directory.name, 'concurrency.sqlite3')
+        self.connect().cursor().execute('CREATE TABLE item (id integer)')
+
+    def connect(self):
+        # У каждого ConnectionHandler своё соединение
+        handler = ConnectionHandler({'default': {
+            'ENGINE': 'django.db.backends.sqlite3', 'NAME': self.path,
+        }})
+        self.handlers.append(handler)
+        self.addCleanup(handler.close_all)
+        return handler['default']
+
+    def handler(self):
+        # Соединения ConnectionHandler свои у каждого потока; atomic()
+        # берёт их из django.db.transaction.connections
+        handler = ConnectionHandler({'default': {
+            'ENGINE': 'django.db.backends.sqlite3', 'NAME': self.path,
+        }})
+        self.addCleanup(handler.close_all)
+        patcher = mock.patch('django.db.transaction.connections', handler)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return handler
+
+    def count(self, connection):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT count(*) FROM item')
+            return cursor.fetchone()[0]
+
+    def test_pragmas_applied(self):
+        """Новое соединение получает PRAGMA из SQLITE_PRAGMAS."""
+        with self.connect().cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(
+                cursor.fetchone()[0], settings.SQLITE_PRAGMAS['busy_timeout']
+            )
+
+    def test_readers_proceed_during_writes(self):
+        """Читатель не блокирует запись и не ждёт её фиксации."""
+        reader, handler = self.connect(), self.handler()
+        reader.cursor().execute('BEGIN')
+        self.assertEqual(self.count(reader), 0)
+        # В режиме журнала отката эта фиксация ждала бы читателя
+        with transaction.atomic():
+            handler['default'].cursor().execute('INSERT INTO item VALUES (1)')
+            self.assertEqual(self.count(reader), 0)
+        self.assertEqual(self.count(reader), 0)
+        reader.cursor().execute('COMMIT')
+        self.assertEqual(self.count(reader), 1)
+
+    def test_read_then_write_transactions_wait(self):
+        """Две транзакции «прочитать, потом записать» не падают.
+
+        Обе идут через atomic(), как в приложении; с отложенным BEGIN
+        вторая получила бы «database is locked», не дождавшись
+        busy_timeout.
+        """
+        handler = self.handler()
+        first_read = threading.Event()
+        errors = []
+
+        def work(before_write):
+            connection = handler['default']
+            try:
+                with transaction.atomic():
+                    self.count(connection)
+                    before_write()
+                    connection.cursor().execute('INSERT INTO item VALUES (1)')
+            except OperationalError as error:
+                errors.append(error)
+            finally:
+                connection.close()
+
+        def pause():
+            first_read.set()
+            time.sleep(0.2)
+
+        first = threading.Thread(target=work, args=(pause,))
+        second = threading.Thread(target=work, args=(lambda: None,))
+        first.start()
+        first_read.wait()
+        second.start()
+        first.join()
+        second.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(self.count(self.connect()), 2)
+
+
+def _increment(location, times):
+    cache = MmapCache(location, {})
+    for _ in range(times):
+        cache.incr('counter')
+
+
+class MmapCacheTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.location = os.path.join(directory.name, 'cache')
+
+    def make(self, **options):
+        return MmapCache(self.location, {'OPTIONS': options})
+
+    def test_api(self):
+        cache = self.make()
+        cache.set('post', {'text': 'Текст'})
+        self.assertEqual(cache.get('post'), {'text': 'Текст'})
+        self.assertFalse(cache.add('post', 'другое'))
+        self.assertTrue(cache.add('group', 'слаг'))
+        self.assertEqual(
+            cache.get_many(['post', 'group', 'нет']),
+            {'post': {'text': 'Текст'}, 'group': 'слаг'},
+        )
+        cache.set('views', 1)
+        self.assertEqual(cache.incr('views', 10), 11)
+        self.assertEqual(cache.decr('views'), 10)
+        with self.assertRaises(ValueError):
+            cache.incr('нет')
+        cache.delete('post')
+        self.assertIsNone(cache.get('post'))
+        cache.clear()
+        self.assertIsNone(cache.get('group'))
+
+    def test_shared_between_instances(self):
+        """Экземпляры разных воркеров видят один файл."""
+        self.make().set('page', 'html')
+        self.assertEqual(self.make().get('page'), 'html')
+
+    def test_timeouts(self):
+        cache = self.make()
+        cache.set('short', 1, timeout=10)
+        cache.set('forever', 2, timeout=None)
+        later = time.time() + 60
+        with mock.patch('core.cache.time.time', return_value=later):
+            self.assertIsNone(cache.get('short'))
+            self.assertEqual(cache.get('forever'), 2)
+        self.assertTrue(cache.touch('short', timeout=0))
+        self.assertIsNone(cache.get('short'))
+
+    def test_lru_eviction(self):
+        """При нехватке места вытесняется давно не читанное."""
+        cache = self.make(SIZE=8192, MAX_ENTRY=2048)
+        clock = itertools.count(time.time())
+        with mock.patch('core.cache.time.time', side_effect=clock.__next__):
+            for number in range(4):
+                cache.set(f'key{number}', bytes(1800))
+            cache.get('key0')
+            cache.set('key4', bytes(1800))
+            self.assertIsNotNone(cache.get('key0'))
+            self.assertIsNone(cache.get('key1'))
+            self.assertIsNotNone(cache.get('key4'))
+        self.assertFalse(cache.add('huge', bytes(4096)))
+
+    def test_threads_share_one_descriptor(self):
+        """Экземпляры бэкенда в потоках не открывают файл заново."""
+        self.make().set('key', 0)
+        before = len(os.listdir('/proc/self/fd'))
+
+        def work():
+            cache = self.make()
+            cache.set('key', 1)
+            cache.get('key')
+            cache.close()
+
+        threads = [threading.Thread(target=work) for _ in range(50)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertLessEqual(len(os.listdir('/proc/self/fd')), before)
+
+    def test_foreign_files_refused(self):
+        """Файл или каталог, доступные другим, не открываются."""
+        with open(self.location, 'wb'):
+            pass
+        os.chmod(self.location, 0o644)
+        with self.assertRaises(ImproperlyConfigured):
+            self.make().get('key')
+        directory = os.path.dirname(self.location)
+        os.remove(self.location)
+        os.chmod(directory, 0o777)
+        self.addCleanup(os.chmod, directory, 0o700)
+        with self.assertRaises(ImproperlyConfigured):
+            self.make().get('key')
+
+    def test_broken_pickle_is_miss(self):
+        """Нераспаковываемое значение — промах, а не исключение."""
+        cache = self.make()
+        cache.set('key', 'значение')
+        key = cache.encode('key', None)
+        with cache.locked():
+            cache.store(key, b'not a pickle', None)
+        self.assertIsNone(cache.get('key'))
+        self.assertEqual(cache.get('key', 'нет'), 'нет')
+        with self.assertRaises(ValueError):
+            cache.incr('key')
+
+    def test_incr_is_atomic_across_processes(self):
+        self.make().set('counter', 0)
+        context = multiprocessing.get_context('fork')
+        workers = [
+            context.Process(target=_increment, args=(self.location, 200))
+            for _ in range(4)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(self.make().get('counter'), 800)
+
+
+class StampedeTests(SimpleTestCase):
+    def setUp(self):
+        self.cache = LocMemCache('stampede-tests', {})
+        self.cache.clear()
+        self.calls = 0
+
+    def compute(self, value='новое', delay=0):
+        def compute():
+            self.calls += 1
+            time.sleep(delay)
+            return value
+        return compute
+
+    def get(self, compute, **options):
+        options.setdefault('timeout', 60)
+        return stampede.get_or_set('key', compute, cache=self.cache, **options)
+
+    def test_single_flight_on_miss(self):
+        """Пустой ключ считает один поток, остальные ждут его."""
+        results = []
+        compute = self.compute(delay=0.2)
+        threads = [
+            threading.Thread(target=lambda: results.append(self.get(compute)))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, ['новое'] * 8)
+        self.assertEqual(self.calls, 1)
+
+    def test_stale_served_while_recomputing(self):
+        """Пока другой пересчитывает, отдаётся прежнее значение."""
+        self.cache.set('key', ('старое', None, time.time() - 1, 0.0))
+        self.cache.add('key:recompute', 'другой процесс')
+        self.assertEqual(self.get(self.compute()), 'старое')
+        self.assertEqual(self.calls, 0)
+        self.cache.delete('key:recompute')
+        self.assertEqual(self.get(self.compute()), 'новое')
+        self.assertEqual(self.get(self.compute('ещё новее')), 'новое')
+        self.assertEqual(self.calls, 1)
+
+    def test_previous_version_served_while_recomputing(self):
+        """Пока другой пересчитывает, отдаётся прежняя версия."""
+        self.get(self.compute('первая'), version='v1')
+        self.cache.add('key:recompute', 'другой процесс')
+        self.assertEqual(
+            self.get(self.compute('вторая'), version='v2'), 'первая'
+        )
+        self.cache.delete('key:recompute')
+        self.assertEqual(
+            self.get(self.compute('вторая'), version='v2'), 'вторая'
+        )
+
+    def test_early_refresh(self):
+        """Долгий расчёт близко к сроку обновляется заранее."""
+        self.cache.set('key', ('старое', None, time.time() + 10, 5.0))
+        with mock.patch('core.stampede.random.random', return_value=0.9999):
+            self.assertEqual(self.get(self.compute(), beta=0), 'старое')
+            self.assertEqual(self.get(self.compute()), 'новое')
+        self.assertEqual(self.calls, 1)
+
+    @override_settings(STAMPEDE_WAIT=0.1)
+    def test_computes_itself_after_wait(self):
+        """Если победитель не успел, запрос считает сам."""
+        self.cache.add('key:recompute', 'упавший процесс')
+        self.assertEqual(self.get(self.compute()), 'новое')
+        self.assertEqual(self.calls, 1)
+
+    def test_template_tag(self):
+        """Тег кеширует фрагмент и перерисовывает его с новой версией."""
+        cache.clear()
+        template = Template(
+            '{% load fragment_cache %}'
+            '{% fragment_cache 60 test_fragment name version=version %}'
+            '{{ value }}{% endfragment_cache %}'
+        )
+
+        def render(**context):
+            return template.render(Context({'name': 'a', **context}))
+
+        self.assertEqual(render(value=1, version=1), '1')
+        self.assertEqual(render(value=2, version=1), '1')
+        self.assertEqual(render(value=3, version=2), '3')
+        self.assertEqual(render(value=4, version=2, name='b'), '4')
@@ -0,0 +1,111 @@
+"""Замер задержек страниц через тестовый клиент Django.
+
+Каждый сценарий — адрес и метод; запрос повторяется ``repeat`` раз после
+прогрева, для каждого считаются время, число SQL-запросов и размер
+ответа. Результат сравнивается с сохранённым базовым прогоном: рост p95
+сверх допуска или лишние запросы считаются регрессией.
+"""
+import math
+import statistics
+import time
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .models import Group, Post
+
+# Разница p95 меньше этого порога (мс) считается шумом
+NOISE_MS = 1.0
+
+
+def scenarios(reader):
+    """Сценарии для всех страниц posts и users от имени ``reader``."""
+    post = Post.objects.filter(author=reader).first() or Post.objects.first()
+    group = Group.objects.first()
+    author = post.author
+    return [
+        ('posts:index', 'get', reverse('posts:index'), None),
+        ('posts:index?page=20', 'get', reverse('posts:index') + '?page=20',
+         None),
+        ('posts:group_list', 'get',
+         reverse('posts:group_list', args=(group.slug,)), None),
+        ('posts:profile', 'get',
+         reverse('posts:profile', args=(author.username,)), None),
+        ('posts:post_detail', 'get',
+         reverse('posts:post_detail', args=(post.id,)), None),
+        ('posts:comments', 'get',
+         reverse('posts:comments', args=(post.id,)), None),
+        ('posts:search', 'get', reverse('posts:search') + '?q=котик', None),
+        ('posts:follow_index', 'get', reverse('posts:follow_index'), None),
+        ('posts:create', 'get', reverse('posts:create'), None),
+        ('posts:create POST', 'post', reverse('posts:create'),
+         {'text': 'Пост из бенчмарка'}),
+        ('posts:edit', 'get', reverse('posts:edit', args=(post.id,)), None),
+        ('posts:add_comment POST', 'post',
+         reverse('posts:add_comment', args=(post.id,)),
+         {'text': 'Комментарий из бенчмарка'}),
+        ('users:login', 'get', reverse('users:login'), None),
+        ('users:signup', 'get', reverse('users:signup'), None),
+        ('users:password_change_form', 'get',
+         reverse('users:password_change_form'), None),
+    ]
+
+
+def percentile(values, share):
+    """Перцентиль по ближайшему рангу."""
+    ordered = sorted(values)
+    index = max(math.ceil(share * len(ordered)) - 1, 0)
+    return ordered[index]
+
+
+def measure(client, method, url, data=None, repeat=20, warmup=3):
+    send = getattr(client, method)
+    for _ in range(warmup):
+        send(url, data)
+    timings, queries, sizes, statuses = [], [], [], set()
+    for _ in range(repeat):
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            response = send(url, data)
+            timings.append((time.perf_counter() - started) * 1000)
+        queries.append(len(captured))
+        sizes.append(len(response.content))
+        statuses.add(response.status_code)
+    return {
+        'p50': round(percentile(timings, 0.50), 3),
+        'p95': round(percentile(timings, 0.95), 3),
+        'p99': round(percentile(timings, 0.99), 3),
+        'queries': max(queries),
+        'bytes': int(statistics.median(sizes)),
+        'status': sorted(statuses),
+    }
+
+
+def run(client, reader, repeat=20, warmup=3):
+    return {
+        name: measure(client, method, url, data, repeat, warmup)
+        for name, method, url, data in scenarios(reader)
+    }
+
+
+def compare(results, baseline, tolerance=0.2):
+    """Список регрессий относительно ``baseline``."""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        limit = previous['p95'] * (1 + tolerance)
+        if current['p95'] > limit and (
+            current['p95'] - previous['p95'] > NOISE_MS
+        ):
+            regressions.append(
+                f'{name}: p95 {previous["p95"]} → {current["p95"]} мс'
+            )
+        if current['queries'] > previous['queries']:
+            regressions.append(
+                f'{name}: запросов {previous["queries"]} → '
+                f'{current["queries"]}'
+            )
+    return regressions
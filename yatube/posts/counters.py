@@ -0,0 +1,106 @@
+"""Денормализованные счётчики постов, комментариев и подписок.
+
+Страницы читают готовые числа из ``AuthorCounters`` и
+``Post.comments_count`` вместо ``COUNT(*)``. Сигналы меняют счётчики
+одним ``UPDATE ... SET x = x + 1``, поэтому параллельные записи не
+теряются и попадают в транзакцию вызывающего кода. Уменьшение
+ограничено нулём: счётчик, разошедшийся с данными, не должен ломать
+удаление. Если счётчики разошлись с данными (массовая загрузка, ручные
+правки), их пересчитывает команда ``repair_counters``.
+"""
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from .models import AuthorCounters, Comment, Follow, Post
+
+
+def _shift(name, delta):
+    # Поля положительные: ниже нуля CHECK в базе уронил бы запрос
+    if delta < 0:
+        return Greatest(F(name) + delta, 0)
+    return F(name) + delta
+
+
+def change(user_id, **deltas):
+    """Сдвинуть счётчики пользователя: ``change(1, posts_count=1)``."""
+    if user_id is None:
+        return
+    updated = AuthorCounters.objects.filter(user_id=user_id).update(
+        **{name: _shift(name, delta) for name, delta in deltas.items()}
+    )
+    if not updated and all(delta > 0 for delta in deltas.values()):
+        # Строки ещё нет: считаем точно, изменение уже в базе.
+        recount_users([user_id])
+
+
+def change_comments(post_id, delta):
+    # Число комментариев видно в карточке: сдвигаем и время изменения
+    if post_id is not None:
+        Post.objects.filter(pk=post_id).update(
+            comments_count=_shift('comments_count', delta),
+            updated_at=timezone.now(),
+        )
+
+
+def counters_for(user):
+    """Счётчики пользователя; без запроса, если выбраны select_related."""
+    try:
+        return user.counters
+    except AuthorCounters.DoesNotExist:
+        recount_users([user.id])
+        return AuthorCounters.objects.get(user_id=user.id)
+
+
+def _grouped(queryset, field):
+    return dict(
+        queryset.order_by().values(field)
+        .annotate(total=Count('pk'))
+        .values_list(field, 'total')
+    )
+
+
+@transaction.atomic
+def recount_users(user_ids):
+    """Пересчитать счётчики пачки пользователей тремя агрегатами."""
+    user_ids = list(user_ids)
+    posts = _grouped(Post.objects.filter(author_id__in=user_ids), 'author')
+    followers = _grouped(
+        Follow.objects.filter(author_id__in=user_ids), 'author'
+    )
+    following = _grouped(Follow.objects.filter(user_id__in=user_ids), 'user')
+    rows = [
+        AuthorCounters(
+            user_id=user_id,
+            posts_count=posts.get(user_id, 0),
+            followers_count=followers.get(user_id, 0),
+            following_count=following.get(user_id, 0),
+        )
+        for user_id in user_ids
+    ]
+    existing = set(
+        AuthorCounters.objects.filter(user_id__in=user_ids)
+        .values_list('user_id', flat=True)
+    )
+    fields = ['posts_count', 'followers_count', 'following_count']
+    AuthorCounters.objects.bulk_update(
+        [row for row in rows if row.user_id in existing], fields
+    )
+    AuthorCounters.objects.bulk_create(
+        [row for row in rows if row.user_id not in existing],
+        ignore_conflicts=True,
+    )
+
+
+@transaction.atomic
+def recount_posts(post_ids):
+    """Пересчитать число комментариев пачки постов одним UPDATE."""
+    comments = (
+        Comment.objects.filter(post=OuterRef('pk')).order_by()
+        .values('post').annotate(total=Count('pk')).values('total')
+    )
+    Post.objects.filter(pk__in=list(post_ids)).update(
+        comments_count=Coalesce(Subquery(comments), 0),
+        updated_at=timezone.now(),
+    )
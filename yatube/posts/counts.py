@@ -0,0 +1,126 @@
+"""Число записей для постраничных списков без ``COUNT(*)`` на каждый запрос.
+
+Точное число считается подзапросом с ``LIMIT``: база просматривает не
+больше ``COUNT_EXACT_LIMIT + 1`` строк. Результат хранится в кеше под
+поколениями области списка, поэтому любая запись, которая меняет
+список, сдвигает поколение, и число пересчитывается. Если строк больше
+лимита, берётся оценка планировщика: ``EXPLAIN`` в PostgreSQL или
+статистика ``ANALYZE`` (``sqlite_stat1``) для индекса из плана SQLite.
+Без оценки известна только нижняя граница — сам лимит.
+"""
+import hashlib
+import json
+import re
+from typing import NamedTuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+
+from core import routers
+
+from . import generations
+
+# Строка плана SQLite: SEARCH posts_post USING INDEX idx (group_id=?)
+PLAN_STEP = re.compile(
+    r'^(?:SEARCH|SCAN) (\w+)(?: AS \w+)?'
+    r'(?: USING (?:COVERING )?INDEX (\w+)(?: \((.*)\))?)?'
+)
+# Условие плана, которое sqlite_stat1 оценивает: только col=? через AND
+EQUALITY_PREFIX = re.compile(r'^\w+=\?(?: AND \w+=\?)*$')
+
+
+class Total(NamedTuple):
+    value: int
+    exact: bool
+
+
+def analyze():
+    """Обновить статистику планировщика после массовой загрузки."""
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+
+
+def _sqlite_estimate(sql, params):
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        steps = [
+            PLAN_STEP.match(row[-1]) for row in cursor.fetchall()
+            if row[-1].startswith(('SEARCH', 'SCAN'))
+        ]
+        # Соединения оценить по sqlite_stat1 не выйдет
+        if len(steps) != 1 or steps[0] is None:
+            return None
+        table, index, condition = steps[0].groups()
+        # Таблицы статистики нет, пока не было ни одного ANALYZE
+        cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'"
+        )
+        if cursor.fetchone() is None:
+            return None
+        cursor.execute(
+            'SELECT idx, stat FROM sqlite_stat1 WHERE tbl = %s', (table,)
+        )
+        stats = {idx: stat.split() for idx, stat in cursor.fetchall()}
+    if not stats:
+        return None
+    if index is None:
+        # Полный просмотр с фильтром: число строк таблицы — не оценка
+        if ' WHERE ' in sql:
+            return None
+        return int(next(iter(stats.values()))[0])
+    stat = stats.get(index)
+    # Диапазон (col>?) по статистике не оценить
+    if stat is None or not (
+        condition is None or EQUALITY_PREFIX.match(condition)
+    ):
+        return None
+    # Первое число — строк в таблице, дальше — строк на значение
+    # префикса индекса из одной, двух и т. д. колонок
+    equal = condition.count('=') if condition else 0
+    if equal >= len(stat):
+        return None
+    return int(stat[equal])
+
+
+def _postgresql_estimate(sql, params):
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def _query(queryset):
+    # select_related добавил бы в план соединения, не влияющие на число
+    return queryset.order_by().values('pk').query.sql_with_params()
+
+
+def estimate(queryset):
+    """Оценка числа строк по плану запроса или None."""
+    sql, params = _query(queryset)
+    if connection.vendor == 'sqlite':
+        return _sqlite_estimate(sql, params)
+    if connection.vendor == 'postgresql':
+        return _postgresql_estimate(sql, params)
+    return None
+
+
+def total(queryset, *scopes):
+    """Точное число строк до лимита, дальше — оценка; из кеша."""
+    sql, params = _query(queryset)
+    digest = hashlib.md5(f'{sql}|{params}'.encode()).hexdigest()
+    key = f'count:{digest}:{generations.stamp(*scopes)}'
+    cached = cache.get(key)
+    if cached is not None:
+        return Total(*cached)
+    limit = settings.COUNT_EXACT_LIMIT
+    # Число ляжет в кеш: реплика могла отстать от поколения
+    with routers.primary():
+        value = queryset.order_by()[:limit + 1].count()
+    result = Total(value, True)
+    if value > limit:
+        result = Total(max(estimate(queryset) or 0, limit), False)
+    cache.set(key, tuple(result), settings.COUNT_CACHE_TIMEOUT)
+    return result
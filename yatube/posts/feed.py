@@ -0,0 +1,203 @@
+"""Лента подписок, материализованная при записи (fan-out on write).
+
+Новый пост раскладывается в ``FeedItem`` всех подписчиков автора, поэтому
+страница ``follow_index`` читается одним диапазоном индекса
+``(user, pub_date, post)``. Посты авторов, у которых подписчиков больше
+``FEED_FANOUT_LIMIT``, не раскладываются: их ленты дотягивают при чтении.
+Каждое изменение ``FeedItem`` читателя сдвигает его поколение
+``generations.follow``, поэтому число записей ленты (``total``) не
+пересчитывается от постов чужих авторов.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Count, F, Window
+from django.db.models.functions import RowNumber
+
+from core import stampede
+
+from . import counts, generations
+from .models import FeedItem, Follow, Post
+from .pagination import KeysetPaginator
+
+PULLED_AUTHORS_KEY = 'feed:pulled_authors'
+
+
+def pulled_authors():
+    """Авторы, чьи посты не раскладываются по лентам, а читаются напрямую."""
+    # Агрегат по всем подпискам: пересчитывает его один запрос
+    return stampede.get_or_set(
+        PULLED_AUTHORS_KEY,
+        lambda: frozenset(
+            Follow.objects.values('author')
+            .annotate(followers=Count('id'))
+            .filter(followers__gt=settings.FEED_FANOUT_LIMIT)
+            .values_list('author', flat=True)
+        ),
+        settings.FEED_PULLED_AUTHORS_TIMEOUT,
+    )
+
+
+def _bulk_insert(items):
+    FeedItem.objects.bulk_create(
+        items, batch_size=settings.FEED_BATCH_SIZE, ignore_conflicts=True
+    )
+
+
+def _followers(author_id):
+    return list(
+        Follow.objects.filter(author_id=author_id)
+        .values_list('user_id', flat=True)
+    )
+
+
+def _touch(user_ids):
+    generations.bump(*(generations.follow(user_id) for user_id in user_ids))
+
+
+def fan_out(post):
+    """Разложить новый пост по лентам подписчиков автора."""
+    if post.author_id in pulled_authors():
+        return
+    # Подписчиков не больше FEED_FANOUT_LIMIT, иначе автор «тяжёлый»
+    followers = _followers(post.author_id)
+    _bulk_insert(
+        FeedItem(user_id=user_id, post_id=post.id, pub_date=post.pub_date)
+        for user_id in followers
+    )
+    _touch(followers)
+
+
+def retract(post):
+    """Сдвинуть поколения лент, из которых каскадом удалён пост."""
+    if post.author_id not in pulled_authors():
+        _touch(_followers(post.author_id))
+
+
+def backfill(user, author):
+    """Добавить в ленту подписчика последние посты нового автора."""
+    if author.id in pulled_authors():
+        return
+    posts = (
+        Post.objects.filter(author=author)
+        .order_by('-pub_date', '-id')
+        .values_list('id', 'pub_date')[:settings.FEED_BACKFILL_LIMIT]
+    )
+    _bulk_insert(
+        FeedItem(user_id=user.id, post_id=post_id, pub_date=pub_date)
+        for post_id, pub_date in posts
+    )
+
+
+def prune(user, author):
+    """Убрать из ленты посты автора, от которого отписались."""
+    FeedItem.objects.filter(user=user, post__author=author).delete()
+
+
+def fill(follows):
+    """Разложить по лентам посты авторов из подписок ``follows``.
+
+    Для массовой загрузки, когда сигналы не срабатывают: одна вставка
+    ``INSERT ... SELECT``. Как и при подписке, от автора берутся только
+    последние ``FEED_BACKFILL_LIMIT`` постов.
+    """
+    cache.delete(PULLED_AUTHORS_KEY)
+    follows = follows.exclude(author_id__in=pulled_authors()).order_by()
+    follows_sql, follows_params = (
+        follows.values('user_id', 'author_id').query.sql_with_params()
+    )
+    posts = Post.objects.filter(
+        author_id__in=follows.values('author_id')
+    ).annotate(
+        number=Window(
+            RowNumber(),
+            partition_by=[F('author_id')],
+            order_by=[F('pub_date').desc(), F('id').desc()],
+        )
+    ).order_by()
+    posts_sql, posts_params = (
+        posts.values('id', 'author_id', 'pub_date', 'number')
+        .query.sql_with_params()
+    )
+    insert = connection.ops.insert_statement(ignore_conflicts=True)
+    suffix = connection.ops.ignore_conflicts_suffix_sql(ignore_conflicts=True)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'{insert} {FeedItem._meta.db_table} (user_id, post_id, pub_date) '
+            f'SELECT follow.user_id, post.id, post.pub_date '
+            f'FROM ({follows_sql}) follow JOIN ({posts_sql}) post '
+            f'ON post.author_id = follow.author_id '
+            f'WHERE post.number <= %s {suffix}',
+            (*follows_params, *posts_params, settings.FEED_BACKFILL_LIMIT),
+        )
+    _touch(follows.values_list('user_id', flat=True).distinct())
+
+
+def total(reader):
+    """Число постов ленты читателя — то, что листает ``FeedPaginator``.
+
+    Строки ``FeedItem`` читателя плюс посты «тяжёлых» авторов, на
+    которых он подписан; посты таких авторов, разложенные раньше, чем
+    автор стал «тяжёлым», не считаются дважды.
+    """
+    authors = sorted(pulled_authors())
+    scopes = (
+        generations.follow(reader.id),
+        *(generations.author(author_id) for author_id in authors),
+    )
+    items = FeedItem.objects.filter(user=reader)
+    if not authors:
+        return counts.total(items, *scopes)
+    items = counts.total(
+        items.exclude(post__author_id__in=authors), *scopes
+    )
+    pulled = counts.total(
+        Post.objects.filter(
+            author__following__user=reader, author_id__in=authors
+        ),
+        *scopes
+    )
+    return counts.Total(
+        items.value + pulled.value, items.exact and pulled.exact
+    )
+
+
+class FeedPaginator(KeysetPaginator):
+    """Keyset-пагинация ленты: диапазон FeedItem плюс посты
+    «тяжёлых» авторов, которые сливаются по тому же ключу."""
+
+    def __init__(self, object_list, per_page, reader, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.items = (
+            FeedItem.objects.filter(user=reader)
+            .select_related('post__author', 'post__group')
+            .order_by('-pub_date', '-post_id')
+        )
+        authors = pulled_authors()
+        self.pulled = None
+        if authors:
+            self.pulled = (
+                Post.objects.select_related('author', 'group')
+                .filter(
+                    author__following__user=reader,
+                    author_id__in=authors,
+                )
+                .order_by(*self.ordering)
+            )
+
+    def _fetch(self, values=None, backwards=False, offset=0):
+        limit = offset + self.per_page + 1
+        items = self._range(
+            self.items, values, backwards, ('pub_date', 'post_id')
+        )
+        posts = [item.post for item in items[:limit]]
+        if self.pulled is not None:
+            pulled = self._range(self.pulled, values, backwards)[:limit]
+            merged = {post.id: post for post in posts}
+            merged.update((post.id, post) for post in pulled)
+            posts = sorted(
+                merged.values(),
+                key=lambda post: (post.pub_date, post.id),
+                reverse=self.descending[0] != backwards,
+            )
+        return posts[offset:limit]
@@ -0,0 +1,61 @@
+"""Поколения кеша для фрагментов страниц.
+
+Каждая область (вся лента, группа, автор, пост, лента подписок читателя)
+хранит в кеше счётчик-поколение. Он входит в ключ фрагмента, поэтому
+фрагменты живут часами, а любое изменение содержимого сдвигает поколение
+и делает старые ключи недостижимыми. Пропавший из кеша счётчик
+заводится заново текущим временем в наносекундах — новое значение
+заведомо больше прежних, и старые фрагменты не оживают.
+Страничные фрагменты (``{% fragment_cache %}``) хранят поколение как
+версию записи: прежняя версия отдаётся, пока один запрос отрисовывает
+новую (``core.stampede``).
+"""
+import time
+
+from django.core.cache import cache
+
+POSTS = ('posts',)
+
+
+def group(group_id):
+    return ('group', group_id)
+
+
+def author(user_id):
+    return ('author', user_id)
+
+
+def post(post_id):
+    return ('post', post_id)
+
+
+def follow(user_id):
+    return ('follow', user_id)
+
+
+def _key(scope):
+    return 'generation:' + ':'.join(str(part) for part in scope)
+
+
+def stamp(*scopes):
+    """Строка из поколений областей для ключа фрагмента."""
+    keys = [_key(scope) for scope in scopes]
+    values = cache.get_many(keys)
+    for key in keys:
+        if key not in values:
+            values[key] = time.time_ns()
+            if not cache.add(key, values[key], None):
+                values[key] = cache.get(key)
+    return '-'.join(str(values[key]) for key in keys)
+
+
+def bump(*scopes):
+    """Сдвинуть поколения областей после изменения содержимого."""
+    for scope in scopes:
+        if scope[-1] is None:
+            continue
+        key = _key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, time.time_ns(), None)
@@ -0,0 +1,116 @@
+"""Нормализация загружаемых картинок постов.
+
+Картинка уменьшается до ``POST_IMAGE_MAX_SIZE``, перекодируется в JPEG
+с качеством ``POST_IMAGE_QUALITY`` (картинки с прозрачностью — в PNG)
+и теряет EXIF; поворот из EXIF применяется к пикселям заранее.
+Размер проверяется по заголовку, до декодирования, поэтому
+«декомпрессионные бомбы» отклоняются без расхода памяти. JPEG
+декодируется сразу в уменьшенном масштабе (``Image.draft``), результат
+пишется во временный файл, который уходит на диск, если он велик.
+Небольшие картинки без метаданных и анимация сохраняются как есть,
+как и оригинал, который перекодировался только из-за размера файла и
+не стал от этого меньше. Сэкономленные байты пишутся в журнал
+``posts.images`` и в счётчик ``yatube_image_bytes_saved_total``.
+
+Ограничение: PNG, GIF и WebP так уменьшать при декодировании нельзя,
+они распаковываются в память целиком — до ``POST_IMAGE_MAX_PIXELS``
+пикселей, то есть до четырёх байт на пиксель.
+"""
+import logging
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import UploadedFile
+from PIL import Image, ImageOps
+
+from core import metrics
+
+logger = logging.getLogger(__name__)
+
+EXTENSIONS = {'JPEG': 'jpg', 'PNG': 'png'}
+
+
+def _has_alpha(image):
+    return image.mode in ('RGBA', 'LA', 'PA') or (
+        image.mode == 'P' and 'transparency' in image.info
+    )
+
+
+def _needs_work(image, upload, max_size):
+    return (
+        image.width > max_size[0]
+        or image.height > max_size[1]
+        or upload.size > settings.POST_IMAGE_PASSTHROUGH_BYTES
+        or bool(image.getexif())
+    )
+
+
+def normalize(upload):
+    """Вернуть нормализованную копию загрузки или её саму."""
+    max_size = settings.POST_IMAGE_MAX_SIZE
+    upload.seek(0)
+    image = Image.open(upload)
+    if image.width * image.height > settings.POST_IMAGE_MAX_PIXELS:
+        raise ValidationError(
+            'Слишком большое изображение: %(width)s×%(height)s.',
+            code='image_too_large',
+            params={'width': image.width, 'height': image.height},
+        )
+    if getattr(image, 'is_animated', False) or not _needs_work(
+        image, upload, max_size
+    ):
+        upload.seek(0)
+        return upload
+    # Без уменьшения и EXIF перекодирование нужно только ради байтов
+    shrink_only = not bool(image.getexif()) and (
+        image.width <= max_size[0] and image.height <= max_size[1]
+    )
+
+    image.draft('RGB', max_size)
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail(max_size, Image.LANCZOS, reducing_gap=3.0)
+    if _has_alpha(image):
+        format = 'PNG'
+        image = image.convert('RGBA')
+        options = {'optimize': True}
+    else:
+        format = 'JPEG'
+        image = image.convert('RGB')
+        options = {
+            'quality': settings.POST_IMAGE_QUALITY,
+            'optimize': True,
+            'progressive': True,
+        }
+
+    output = tempfile.SpooledTemporaryFile(
+        max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE
+    )
+    image.save(output, format, **options)
+    size = output.tell()
+    if shrink_only and size >= upload.size:
+        logger.info(
+            'Картинка %s: перекодирование не уменьшило её (%d → %d байт)',
+            upload.name, upload.size, size,
+        )
+        output.close()
+        upload.seek(0)
+        return upload
+    output.seek(0)
+    name = '{}.{}'.format(
+        os.path.splitext(os.path.basename(upload.name))[0],
+        EXTENSIONS[format],
+    )
+    logger.info(
+        'Картинка %s: %d → %d байт, сэкономлено %d',
+        upload.name, upload.size, size, upload.size - size,
+    )
+    if settings.METRICS and upload.size > size:
+        metrics.registry.inc(
+            'yatube_image_bytes_saved_total', {'format': format},
+            upload.size - size,
+        )
+    return UploadedFile(
+        output, name=name, content_type=Image.MIME[format], size=size
+    )
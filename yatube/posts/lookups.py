@@ -0,0 +1,103 @@
+"""Кеш поиска групп по slug и пользователей по username.
+
+Эти строки читаются почти на каждой странице и почти не меняются.
+Найденный объект хранится в кеше ``LOOKUP_CACHE_TIMEOUT`` секунд,
+ненайденный ключ — ``LOOKUP_NEGATIVE_TIMEOUT`` секунд, поэтому и
+несуществующие адреса не доходят до базы. Сигналы сохранения и удаления
+стирают записи прежнего и нового slug или username (``forget``).
+Пользователь кешируется без пароля и прочих служебных полей.
+"""
+import hashlib
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.http import Http404
+
+from core import metrics, routers
+
+from .models import Group
+
+User = get_user_model()
+
+# Имя -> (модель, поле поиска, загружаемые поля или None для всех)
+LOOKUPS = {
+    'group': (Group, 'slug', None),
+    'user': (User, 'username', ('id', 'username', 'first_name',
+                                'last_name')),
+}
+# Значение в кеше для ключа, которого нет в базе
+NOT_FOUND = 'not-found'
+
+
+def _key(name, value):
+    # В URL может оказаться что угодно, а ключ кеша — только ASCII
+    digest = hashlib.md5(str(value).encode()).hexdigest()
+    return f'lookup:{name}:{digest}'
+
+
+def _count(name, result):
+    if settings.METRICS:
+        metrics.registry.inc(
+            'yatube_lookup_cache_total', {'model': name, 'result': result}
+        )
+
+
+def find(name, value):
+    """Объект по значению поля или None; повторно — из кеша."""
+    model, field, fields = LOOKUPS[name]
+    key = _key(name, value)
+    cached = cache.get(key)
+    if cached == NOT_FOUND:
+        _count(name, 'hit')
+        return None
+    if cached is not None:
+        _count(name, 'hit')
+        return cached
+    _count(name, 'miss')
+    queryset = model.objects.all()
+    if fields:
+        queryset = queryset.only(*fields)
+    # Объект ляжет в кеш надолго: читать с отстающей реплики нельзя
+    with routers.primary():
+        obj = queryset.filter(**{field: value}).first()
+    if obj is None:
+        cache.set(key, NOT_FOUND, settings.LOOKUP_NEGATIVE_TIMEOUT)
+    else:
+        cache.set(key, obj, settings.LOOKUP_CACHE_TIMEOUT)
+    return obj
+
+
+def _or_404(name, value):
+    obj = find(name, value)
+    if obj is None:
+        model = LOOKUPS[name][0]
+        raise Http404(
+            f'No {model._meta.object_name} matches the given query.'
+        )
+    return obj
+
+
+def group(slug):
+    return find('group', slug)
+
+
+def user(username):
+    return find('user', username)
+
+
+def group_or_404(slug):
+    return _or_404('group', slug)
+
+
+def user_or_404(username):
+    return _or_404('user', username)
+
+
+def forget(name, *values):
+    """Стереть записи после изменения объекта."""
+    keys = [_key(name, value) for value in values if value is not None]
+    cache.delete_many(keys)
+    # Чтение до конца транзакции могло снова положить старую строку
+    transaction.on_commit(lambda: cache.delete_many(keys))
@@ -0,0 +1,112 @@
+import json
+import platform
+
+import django
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import (setup_test_environment,
+                               teardown_test_environment)
+
+from posts import benchmark
+from posts.seeding import seed
+
+
+# Свои кеши в памяти: общий MmapCache читает работающий сервер, и
+# фрагменты временной базы попали бы к посетителям под теми же ключами
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'benchmark',
+    },
+    'queryset': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'benchmark-queryset',
+        'OPTIONS': {'MAX_ENTRIES': 1000},
+    },
+}
+
+
+class Command(BaseCommand):
+    help = ('Замеряет p50/p95/p99, запросы и размер страниц на '
+            'синтетических данных во временной базе')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--size', type=int, default=2000,
+            help='Сколько постов создать во временной базе',
+        )
+        parser.add_argument('--repeat', type=int, default=30)
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument(
+            '--output', help='Куда записать результаты в JSON',
+        )
+        parser.add_argument(
+            '--baseline', help='JSON прошлого прогона для сравнения',
+        )
+        parser.add_argument(
+            '--tolerance', type=float, default=0.2,
+            help='Допустимый рост p95 относительно базового прогона',
+        )
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline'], encoding='utf-8') as file:
+                baseline = json.load(file)['results']
+
+        # Бенчмарк не трогает рабочую базу и рабочий кеш: данные живут
+        # в тестовой базе, а замена CACHES сбрасывает и
+        # django.core.cache.caches (django.test.signals)
+        with override_settings(CACHES=CACHES):
+            setup_test_environment(debug=False)
+            name = connection.creation.create_test_db(
+                verbosity=0, autoclobber=True
+            )
+            try:
+                cache.clear()
+                reader = seed(options['size'])
+                client = Client()
+                client.force_login(reader)
+                results = benchmark.run(
+                    client, reader, options['repeat'], options['warmup']
+                )
+            finally:
+                connection.creation.destroy_test_db(name, verbosity=0)
+                teardown_test_environment()
+
+        report = {
+            'meta': {
+                'size': options['size'],
+                'repeat': options['repeat'],
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+            },
+            'results': results,
+        }
+        self.print_table(results)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+        if baseline is not None:
+            regressions = benchmark.compare(
+                results, baseline, options['tolerance']
+            )
+            if regressions:
+                raise CommandError(
+                    'Регрессии:\n' + '\n'.join(regressions)
+                )
+            self.stdout.write(self.style.SUCCESS('Регрессий нет'))
+
+    def print_table(self, results):
+        self.stdout.write(
+            f'{"страница":<32}{"p50":>9}{"p95":>9}{"p99":>9}'
+            f'{"SQL":>6}{"байт":>9}'
+        )
+        for name, row in results.items():
+            self.stdout.write(
+                f'{name:<32}{row["p50"]:>9.2f}{row["p95"]:>9.2f}'
+                f'{row["p99"]:>9.2f}{row["queries"]:>6}{row["bytes"]:>9}'
+            )
@@ -0,0 +1,41 @@
+import sys
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+
+from posts.transfer import Importer
+
+
+class Command(BaseCommand):
+    help = 'Загружает NDJSON из export_yatube пачками через bulk_create'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', default='-',
+            help='Файл с выгрузкой, «-» — стандартный ввод',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=2000,
+            help='Сколько строк вставлять за одну транзакцию',
+        )
+
+    def handle(self, *args, **options):
+        importer = Importer(
+            batch_size=options['batch_size'],
+            progress=self.stderr.write if options['verbosity'] else None,
+        )
+        if options['path'] == '-':
+            totals = importer.run(sys.stdin)
+        else:
+            with open(options['path'], encoding='utf-8') as stream:
+                totals = importer.run(stream)
+        # Сигналы при bulk_create не срабатывают: пересчитать производное
+        call_command(
+            'repair_counters', batch_size=options['batch_size'],
+            stdout=self.stdout,
+        )
+        call_command('rebuild_search_index', stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(
+            'Загружено: '
+            + ', '.join(f'{name} {count}' for name, count in totals.items())
+        ))
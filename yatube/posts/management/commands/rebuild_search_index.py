@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import generations, search
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает полнотекстовый индекс постов'
+
+    def handle(self, *args, **options):
+        if not search.enabled():
+            self.stdout.write('Индекс FTS5 поддерживается только в SQLite')
+            return
+        with transaction.atomic():
+            count = search.rebuild()
+        # Закешированные страницы поиска могли устареть
+        generations.bump(generations.POSTS)
+        self.stdout.write(self.style.SUCCESS(
+            f'Проиндексировано постов: {count}'
+        ))
@@ -0,0 +1,45 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from posts.counters import recount_posts, recount_users
+from posts.models import Post
+
+User = get_user_model()
+
+
+def batches(queryset, size):
+    """Первичные ключи пачками по возрастанию, без OFFSET."""
+    last = 0
+    while True:
+        ids = list(
+            queryset.filter(pk__gt=last).order_by('pk')
+            .values_list('pk', flat=True)[:size]
+        )
+        if not ids:
+            return
+        yield ids
+        last = ids[-1]
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает денормализованные счётчики постов и подписок'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Сколько строк пересчитывать за одну транзакцию',
+        )
+
+    def handle(self, *args, **options):
+        size = options['batch_size']
+        users = 0
+        for ids in batches(User.objects.all(), size):
+            recount_users(ids)
+            users += len(ids)
+        posts = 0
+        for ids in batches(Post.objects.all(), size):
+            recount_posts(ids)
+            posts += len(ids)
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитано пользователей: {users}, постов: {posts}'
+        ))
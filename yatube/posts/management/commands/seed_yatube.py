@@ -0,0 +1,59 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.seeding import Seeder
+
+
+class Command(BaseCommand):
+    help = ('Заполняет базу синтетическими пользователями, группами, '
+            'постами, комментариями и подписками')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=50)
+        parser.add_argument('--posts', type=int, default=20000)
+        parser.add_argument(
+            '--comments', type=int,
+            help='Сколько комментариев создать; по умолчанию — как постов',
+        )
+        parser.add_argument(
+            '--follows', type=int, default=20,
+            help='Среднее число подписок на пользователя',
+        )
+        parser.add_argument(
+            '--celebrities', type=int,
+            help='Сколько самых популярных авторов есть почти у всех '
+                 'в подписках; по умолчанию — один на тысячу',
+        )
+        parser.add_argument(
+            '--activity', type=float, default=1.2,
+            help='Показатель степенного закона активности авторов',
+        )
+        parser.add_argument(
+            '--popularity', type=float, default=1.1,
+            help='Показатель степенного закона популярности авторов',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        seeder = Seeder(
+            users=options['users'],
+            groups=options['groups'],
+            posts=options['posts'],
+            comments=options['comments'],
+            follows=options['follows'],
+            celebrities=options['celebrities'],
+            activity=options['activity'],
+            popularity=options['popularity'],
+            seed=options['seed'],
+            batch_size=options['batch_size'],
+            progress=self.stderr.write if options['verbosity'] > 1 else None,
+        )
+        reader = seeder.run()
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово за {time.monotonic() - started:.1f} с; '
+            f'читатель с подписками: {reader.username}'
+        ))
@@ -1,6 +1,8 @@
 from django.db import models
 from django.contrib.auth import get_user_model
 
+from .querycache import CachedQuerySet
+
 User = get_user_model()
 
 
@@ -18,6 +20,8 @@ class Group(models.Model):
         verbose_name='Описание',
     )
 
+    objects = CachedQuerySet.as_manager()
+
     def __str__(self):
         return self.title
 
@@ -31,6 +35,12 @@ class Post(models.Model):
         auto_now_add=True,
         verbose_name='Дата публикации',
     )
+    # Входит в ключ кеша карточки поста; сигналы сдвигают его и при
+    # изменениях, которые видны в карточке, но не сохраняют пост
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения',
+    )
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -50,6 +60,31 @@ class Post(models.Model):
         upload_to='posts/',
         blank=True
     )
+    # Денормализованный счётчик, поддерживается сигналами
+    comments_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Комментариев',
+    )
+
+    objects = CachedQuerySet.as_manager()
+
+    class Meta:
+        # Индексы повторяют фильтр и сортировку лент (pub_date, id)
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='post_pub_date_idx',
+            ),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_pub_date_idx',
+            ),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_pub_date_idx',
+            ),
+        ]
 
     def __str__(self):
         # выводим текст поста
@@ -81,6 +116,17 @@ class Comment(models.Model):
         verbose_name="Время публикации"
     )
 
+    objects = CachedQuerySet.as_manager()
+
+    class Meta:
+        ordering = ('created', 'id')
+        indexes = [
+            models.Index(
+                fields=['post', 'created', 'id'],
+                name='comment_post_created_idx',
+            ),
+        ]
+
     def __str__(self):
         return self.text
 
@@ -99,5 +145,84 @@ class Follow(models.Model):
         verbose_name='Автор, на которого подписались',
     )
 
+    objects = CachedQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'author'],
+                name='unique_follow',
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['author', 'user'],
+                name='follow_author_user_idx',
+            ),
+        ]
+
     def __str__(self):
         return f'{self.user} подписан на {self.author}'
+
+
+class FeedItem(models.Model):
+    # Материализованная лента подписок: строка на пару (читатель, пост)
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed',
+        verbose_name='Читатель',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='feed_items',
+        verbose_name='Пост',
+    )
+    # Копия Post.pub_date, чтобы лента читалась одним диапазоном индекса
+    pub_date = models.DateTimeField(
+        verbose_name='Дата публикации',
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique_feed_item',
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='feed_user_pub_date_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.post_id} в ленте {self.user}'
+
+
+class AuthorCounters(models.Model):
+    # Денормализованные счётчики пользователя, поддерживаются сигналами
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='counters',
+        verbose_name='Пользователь',
+    )
+    posts_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Постов',
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Подписчиков',
+    )
+    following_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Подписок',
+    )
+
+    def __str__(self):
+        return f'Счётчики {self.user}'
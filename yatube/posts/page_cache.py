@@ -0,0 +1,79 @@
+"""Кеш целых страниц для анонимных читателей.
+
+Для запроса без сессионной куки страница описывается валидатором —
+поколениями кеша затронутых областей. Из них и адреса строится ETag;
+по нему браузер получает 304 без вызова view и шаблонов, а сохранённый
+ответ отдаётся остальным анонимным читателям. Запросы с сессией идут
+мимо кеша. ``Last-Modified`` не отдаётся: время последнего поста не
+меняется от правки, удаления или переименования, а поколения
+сдвигаются от любого изменения.
+
+Ответ, в который попал устаревший фрагмент (``core.stampede``: пока
+один запрос пересчитывает фрагмент, остальные получают прежний), не
+сохраняется и уходит без ETag: иначе старое содержимое жило бы под
+ETag новых данных. Страница для кеша рендерится по основной базе
+(``core.routers.primary``).
+"""
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import (get_conditional_response,
+                                patch_cache_control, patch_vary_headers)
+from django.utils.http import quote_etag
+
+from core import routers, stampede
+
+from . import generations
+
+
+def _bypass(request):
+    return (
+        request.method not in ('GET', 'HEAD')
+        or settings.SESSION_COOKIE_NAME in request.COOKIES
+    )
+
+
+def _finish(response, etag=None):
+    patch_vary_headers(response, ('Cookie',))
+    if etag is None:
+        patch_cache_control(response, private=True)
+        return response
+    patch_cache_control(response, max_age=0)
+    response['ETag'] = etag
+    return response
+
+
+def cache_anonymous_page(validator):
+    """Декоратор view: ``validator(request, **kwargs)`` возвращает
+    области поколений страницы или ``None``, если кешировать нельзя."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            scopes = None if _bypass(request) else validator(
+                request, *args, **kwargs
+            )
+            if scopes is None:
+                return _finish(view(request, *args, **kwargs))
+            digest = hashlib.md5('|'.join((
+                request.get_full_path(), generations.stamp(*scopes),
+            )).encode()).hexdigest()
+            etag = quote_etag(digest)
+            response = get_conditional_response(request, etag=etag)
+            if response is not None:
+                return _finish(response, etag)
+            key = f'anonymous_page:{digest}'
+            response = cache.get(key)
+            if response is None:
+                # Ответ ляжет в кеш: читать с отстающей реплики нельзя
+                with routers.primary(), stampede.tracking() as stale:
+                    response = view(request, *args, **kwargs)
+                if stale or response.status_code != 200 or response.cookies:
+                    return _finish(response)
+                cache.set(
+                    key, response, settings.ANONYMOUS_PAGE_CACHE_TIMEOUT
+                )
+            return _finish(response, etag)
+        return wrapper
+    return decorator
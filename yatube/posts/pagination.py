@@ -0,0 +1,230 @@
+import base64
+import binascii
+import datetime
+import json
+import math
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.paginator import Paginator
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+# Сколько соседних номеров страниц показывать с каждой стороны от текущей
+PAGE_WINDOW = 2
+# Дальше этой страницы ссылки по номеру не ставятся: каждая из них — OFFSET,
+# который проходит все предыдущие строки. Глубже листают курсором.
+PAGE_LINK_LIMIT = 50
+# Наибольший номер страницы в ?page=: OFFSET должен помещаться в целое SQL
+MAX_PAGE = 2 ** 31 - 1
+# Границы целых в курсоре (64-битное целое SQLite и PostgreSQL)
+MIN_INT, MAX_INT = -2 ** 63, 2 ** 63 - 1
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    # DjangoJSONEncoder обрезает время до миллисекунд, а курсору нужна
+    # точная граница.
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def _valid_value(value):
+    # Курсор присылает клиент: None, вложенные структуры, NaN и числа,
+    # которые не влезают в столбец, уронили бы запрос
+    if isinstance(value, bool) or value is None:
+        return False
+    if isinstance(value, int):
+        return MIN_INT <= value <= MAX_INT
+    if isinstance(value, float):
+        return math.isfinite(value)
+    return isinstance(value, (str, datetime.datetime, datetime.date))
+
+
+def page_window(number, num_pages, radius=PAGE_WINDOW,
+                limit=PAGE_LINK_LIMIT):
+    """Номера страниц для ссылок: первая, последняя и ``radius`` соседей
+    текущей с каждой стороны; ``None`` отмечает пропуск. Номера дальше
+    ``limit`` (кроме текущего) не показываются."""
+    shown = {1, num_pages, *range(number - radius, number + radius + 1)}
+    window, previous = [], 0
+    for page in sorted(page for page in shown if 1 <= page <= num_pages):
+        if page > limit and page != number:
+            continue
+        if page - previous > 1:
+            window.append(None)
+        window.append(page)
+        previous = page
+    if previous < num_pages:
+        window.append(None)
+    return window
+
+
+class KeysetPaginator(Paginator):
+    """Постраничный вывод по ключу сортировки вместо OFFSET/COUNT.
+
+    Страница выбирается условием на ключ (по умолчанию ``(pub_date, id)``),
+    поэтому глубина листания не влияет на стоимость запроса. Курсоры
+    ``after``/``before`` непрозрачны для клиента. Вместо подсчёта строк
+    выбирается одна лишняя запись: ``num_pages`` означает только известное
+    на текущем шаге число страниц, и ``COUNT(*)`` не выполняется, пока
+    кто-нибудь явно не запросит ``count``.
+
+    ``window`` — номера страниц для ссылок вокруг текущей, считаются один
+    раз на запрос. Номера не дальше ``PAGE_LINK_LIMIT``: за ним OFFSET
+    становится дорогим, и дальше ведёт только «следующая» по курсору.
+    На страницах по курсору номер неизвестен, и окно пустое: остаются
+    ссылки «первая», «предыдущая», «следующая».
+    ``counter`` — необязательная функция, возвращающая ``counts.Total``;
+    она вызывается, только когда шаблон спросит ``total``, поэтому из
+    закешированного фрагмента число записей не считается.
+    """
+
+    def __init__(self, object_list, per_page,
+                 ordering=('-pub_date', '-id'), counter=None, **kwargs):
+        self.counter = counter
+        self.ordering = tuple(ordering)
+        self.fields = [name.lstrip('-') for name in self.ordering]
+        self.descending = [name.startswith('-') for name in self.ordering]
+        super().__init__(object_list.order_by(*self.ordering), per_page,
+                         **kwargs)
+        self.next_cursor = None
+        self.previous_cursor = None
+        self.position = ''
+        self._numbered = None
+        self._known_pages = 1
+
+    @property
+    def num_pages(self):
+        return self._known_pages
+
+    @cached_property
+    def total(self):
+        """Всего записей или None, если подсчёт не задан."""
+        return self.counter() if self.counter else None
+
+    @property
+    def total_pages(self):
+        if self.total is None:
+            return None
+        return max(math.ceil(self.total.value / self.per_page), 1)
+
+    @cached_property
+    def window(self):
+        if self._numbered is None:
+            return []
+        last = self._known_pages
+        if self.total is not None and self.total.exact:
+            last = max(last, self.total_pages)
+        return page_window(self._numbered, last)
+
+    def get_cursor_page(self, after=None, before=None, number=None):
+        """Вернуть страницу по курсору или, для старых ссылок, по номеру."""
+        values = self.decode_cursor(before)
+        if values is not None:
+            self.position = f'before={before}'
+            return self._cursor_page(values, backwards=True)
+        values = self.decode_cursor(after)
+        if values is not None:
+            self.position = f'after={after}'
+            return self._cursor_page(values, backwards=False)
+        try:
+            number = min(max(int(number), 1), MAX_PAGE)
+        except (TypeError, ValueError):
+            number = 1
+        self.position = f'page={number}'
+        return self._numbered_page(number)
+
+    def encode_cursor(self, obj):
+        values = [getattr(obj, name) for name in self.fields]
+        raw = json.dumps(values, cls=CursorEncoder).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def decode_cursor(self, token):
+        if not token:
+            return None
+        try:
+            raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+            values = json.loads(raw.decode())
+            if (
+                not isinstance(values, list)
+                or len(values) != len(self.fields)
+                or not all(map(_valid_value, values))
+            ):
+                return None
+            values = [
+                self._to_python(name, value)
+                for name, value in zip(self.fields, values)
+            ]
+        except (binascii.Error, ValueError, TypeError, ValidationError):
+            return None
+        # to_python мог превратить строку в число вне диапазона
+        if not all(map(_valid_value, values)):
+            return None
+        return values
+
+    def _to_python(self, name, value):
+        try:
+            field = self.object_list.model._meta.get_field(name)
+        except FieldDoesNotExist:
+            # Аннотации и *_id хранятся в курсоре как есть.
+            return value
+        return field.to_python(value)
+
+    def _seek(self, values, backwards, fields=None):
+        # (a < x) OR (a = x AND b < y) ... с ведущим условием a <= x,
+        # чтобы SQLite мог начать просмотр индекса с нужного места.
+        fields = fields or self.fields
+        lookups = [
+            'lt' if descending != backwards else 'gt'
+            for descending in self.descending
+        ]
+        condition = Q()
+        for index, name in enumerate(fields):
+            equal = dict(zip(fields[:index], values[:index]))
+            equal[f'{name}__{lookups[index]}'] = values[index]
+            condition |= Q(**equal)
+        leading = Q(**{f'{fields[0]}__{lookups[0]}e': values[0]})
+        return leading & condition
+
+    def _range(self, queryset, values, backwards, fields=None):
+        if values is not None:
+            queryset = queryset.filter(
+                self._seek(values, backwards, fields)
+            )
+        if backwards:
+            queryset = queryset.reverse()
+        return queryset
+
+    def _fetch(self, values=None, backwards=False, offset=0):
+        queryset = self._range(self.object_list, values, backwards)
+        return list(queryset[offset:offset + self.per_page + 1])
+
+    def _numbered_page(self, number):
+        rows = self._fetch(offset=(number - 1) * self.per_page)
+        has_next = len(rows) > self.per_page
+        return self._build_page(rows[:self.per_page], number, has_next)
+
+    def _cursor_page(self, values, backwards):
+        rows = self._fetch(values, backwards)
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if backwards:
+            if not has_more:
+                # Дошли до начала списка — это первая страница.
+                self.position = 'page=1'
+                return self._numbered_page(1)
+            rows.reverse()
+            return self._build_page(rows, 2, True)
+        return self._build_page(rows, 2, has_more)
+
+    def _build_page(self, rows, number, has_next):
+        self._known_pages = number + int(has_next)
+        if rows and has_next:
+            self.next_cursor = self.encode_cursor(rows[-1])
+        if rows and number > 1:
+            self.previous_cursor = self.encode_cursor(rows[0])
+        if self.position.startswith('page='):
+            self._numbered = number
+        return self._get_page(rows, number, self)
@@ -0,0 +1,173 @@
+"""Кеш результатов запросов ORM по тексту SQL.
+
+``Post.objects....cached()`` помечает queryset: при вычислении результат
+ищется в кеше ``queryset`` по SQL, параметрам и виду строк (объекты,
+словари, кортежи), а ключ дополняется поколениями всех таблиц из
+``FROM`` и ``JOIN``. Любая запись в таблицу — сигналами, ``update()``,
+``bulk_create`` или сырым SQL через соединение Django — сдвигает её
+поколение (``track_writes`` видит каждый ``INSERT``, ``UPDATE`` и
+``DELETE``), поэтому устаревшие результаты становятся недостижимы.
+Запись внутри транзакции сдвигает поколение ещё раз после фиксации:
+иначе в промежутке кто-то закешировал бы старые данные под новым
+поколением.
+
+Кешируются только запросы к таблицам ``TRACKED_MODELS`` без
+``QUERYSET_CACHE_EXCLUDE``; запрос, задевший любую другую таблицу,
+выполняется как обычно. Не кешируются чтение с реплик и чтение внутри
+транзакции, которая уже что-то записала. Память ограничена отдельным
+кешем ``queryset`` (его вытеснение не трогает фрагменты страниц);
+слишком большой результат бэкенд кеша просто не сохраняет
+(``MAX_ENTRY`` у ``core.cache.MmapCache``). ``count()``, ``exists()``
+и агрегаты идут мимо кеша, ``prefetch_related`` выполняется заново.
+
+Вход пользователя (``UPDATE auth_user SET last_login``) поколение не
+сдвигает: иначе каждый вход сбрасывал бы все списки постов с авторами,
+а время входа на страницах не выводится. Попадания и промахи видны в
+метрике ``yatube_queryset_cache_total``.
+"""
+import hashlib
+import re
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import EmptyResultSet
+from django.core.signals import setting_changed
+from django.db import DEFAULT_DB_ALIAS, connections, models, transaction
+from django.dispatch import receiver
+
+from core import metrics
+
+from . import generations
+
+# Модели, записи в таблицы которых отслеживаются
+TRACKED_MODELS = (
+    'posts.Post', 'posts.Comment', 'posts.Follow', 'posts.Group', 'auth.User',
+)
+WRITE = re.compile(
+    r'\s*(?:INSERT(?: OR \w+)? INTO|REPLACE INTO|UPDATE|DELETE FROM)'
+    r'\s+"?(\w+)"?',
+    re.IGNORECASE,
+)
+TABLE = re.compile(r'\b(?:FROM|JOIN)\s+"?(\w+)"?', re.IGNORECASE)
+# Запись, которая не меняет ничего из показанного на страницах
+IGNORED_WRITE = re.compile(
+    r'\s*UPDATE "auth_user" SET "last_login" = %s WHERE'
+)
+
+_tracked = None
+
+
+def tracked_tables():
+    global _tracked
+    if _tracked is None:
+        excluded = {
+            label.lower() for label in settings.QUERYSET_CACHE_EXCLUDE
+        }
+        _tracked = frozenset(
+            apps.get_model(label)._meta.db_table for label in TRACKED_MODELS
+            if label.lower() not in excluded
+        )
+    return _tracked
+
+
+@receiver(setting_changed)
+def reset_tracked_tables(setting, **kwargs):
+    global _tracked
+    if setting == 'QUERYSET_CACHE_EXCLUDE':
+        _tracked = None
+
+
+def table(name):
+    return ('table', name)
+
+
+def track_writes(execute, sql, params, many, context):
+    """Обёртка выполнения SQL: сдвигает поколения изменённых таблиц."""
+    result = execute(sql, params, many, context)
+    match = WRITE.match(sql)
+    if (
+        match and match.group(1) in tracked_tables()
+        and not IGNORED_WRITE.match(sql)
+    ):
+        connection = context['connection']
+        scope = table(match.group(1))
+        generations.bump(scope)
+        if connection.in_atomic_block:
+            connection.querycache_dirty = True
+            transaction.on_commit(
+                lambda: _committed(connection, scope), using=connection.alias
+            )
+    return result
+
+
+def _committed(connection, scope):
+    connection.querycache_dirty = False
+    generations.bump(scope)
+
+
+def install(sender, connection, **kwargs):
+    """Обработчик ``connection_created``."""
+    if track_writes not in connection.execute_wrappers:
+        connection.execute_wrappers.append(track_writes)
+
+
+def _cacheable(queryset):
+    if queryset.db != DEFAULT_DB_ALIAS:
+        return False
+    connection = connections[queryset.db]
+    if not connection.in_atomic_block:
+        connection.querycache_dirty = False
+    return not getattr(connection, 'querycache_dirty', False)
+
+
+def _count(result):
+    if settings.METRICS:
+        metrics.registry.inc('yatube_queryset_cache_total', {'result': result})
+
+
+def fetch(queryset, timeout):
+    """Строки queryset из кеша или из базы; None — кешировать нельзя."""
+    if not _cacheable(queryset):
+        return None
+    try:
+        sql, params = queryset.query.sql_with_params()
+    except EmptyResultSet:
+        return None
+    tables = set(TABLE.findall(sql))
+    if not tables or not tables <= tracked_tables():
+        return None
+    digest = hashlib.md5('|'.join((
+        queryset._iterable_class.__name__, sql, repr(params),
+    )).encode()).hexdigest()
+    key = 'queryset:{}:{}'.format(
+        digest, generations.stamp(*(table(name) for name in sorted(tables)))
+    )
+    cache = caches['queryset']
+    rows = cache.get(key)
+    _count('miss' if rows is None else 'hit')
+    if rows is None:
+        rows = list(queryset._iterable_class(queryset))
+        cache.set(key, rows, timeout)
+    return rows
+
+
+class CachedQuerySet(models.QuerySet):
+    """QuerySet с необязательным кешем результата (``cached()``)."""
+
+    cache_timeout = None
+
+    def cached(self, timeout=None):
+        clone = self._chain()
+        clone.cache_timeout = timeout or settings.QUERYSET_CACHE_TIMEOUT
+        return clone
+
+    def _clone(self):
+        clone = super()._clone()
+        clone.cache_timeout = self.cache_timeout
+        return clone
+
+    def _fetch_all(self):
+        if self._result_cache is None and self.cache_timeout:
+            self._result_cache = fetch(self, self.cache_timeout)
+        super()._fetch_all()
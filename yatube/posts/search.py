@@ -0,0 +1,104 @@
+"""Полнотекстовый поиск по постам на SQLite FTS5.
+
+Текст постов дублируется в виртуальную таблицу ``posts_post_fts``
+(rowid совпадает с id поста); сигналы обновляют её при сохранении и
+удалении поста, команда ``rebuild_search_index`` перестраивает целиком.
+Запрос пользователя разбивается на слова, каждое ищется как префикс,
+результаты упорядочены по BM25 (столбец ``rank``, меньше — лучше).
+Для ранжирования таблица индекса присоединяется к постам один раз:
+``MATCH`` выполняется однажды, а ``rank`` берётся из той же строки,
+а не отдельным подзапросом на каждый пост.
+На других СУБД поиск деградирует до ``icontains`` без ранжирования.
+"""
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+TABLE = 'posts_post_fts'
+
+MATCH_IDS = (
+    f'"posts_post"."id" IN '
+    f'(SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s)'
+)
+JOIN_WHERE = (
+    f'"{TABLE}"."rowid" = "posts_post"."id"',
+    f'"{TABLE}" MATCH %s',
+)
+RANK = f'"{TABLE}"."rank"'
+
+
+def enabled():
+    return connection.vendor == 'sqlite'
+
+
+def terms(query):
+    """Слова запроса без операторов FTS5."""
+    return re.findall(r'\w+', query or '')[:settings.SEARCH_MAX_TERMS]
+
+
+def match_expression(query):
+    return ' '.join(f'"{term}"*' for term in terms(query))
+
+
+def matching(queryset, query):
+    """Посты из ``queryset``, в которых встречаются все слова запроса."""
+    words = terms(query)
+    if not words:
+        return queryset.none()
+    if not enabled():
+        condition = Q()
+        for word in words:
+            condition &= Q(text__icontains=word)
+        return queryset.filter(condition)
+    # filter(id__in=RawSQL(...)) оборачивает подзапрос в скалярный
+    return queryset.extra(
+        where=[MATCH_IDS], params=[match_expression(query)]
+    )
+
+
+def ranked(queryset, query):
+    """То же, что ``matching``, с релевантностью в поле ``rank``."""
+    if not enabled() or not terms(query):
+        queryset = matching(queryset, query)
+        return queryset.annotate(rank=Value(0.0, output_field=FloatField()))
+    # extra(tables=...) — соединение через FROM posts_post, posts_post_fts
+    return queryset.extra(
+        tables=[TABLE], where=list(JOIN_WHERE),
+        params=[match_expression(query)],
+    ).annotate(rank=RawSQL(RANK, (), output_field=FloatField()))
+
+
+def index(post):
+    if enabled():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT OR REPLACE INTO {TABLE} (rowid, text) '
+                f'VALUES (%s, %s)',
+                (post.id, post.text),
+            )
+
+
+def remove(post_id):
+    if enabled():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {TABLE} WHERE rowid = %s', (post_id,)
+            )
+
+
+def rebuild():
+    """Заново заполнить индекс из posts_post; вернуть число постов."""
+    if not enabled():
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE}')
+        cursor.execute(
+            f'INSERT INTO {TABLE} (rowid, text) '
+            f'SELECT id, text FROM posts_post'
+        )
+        count = cursor.rowcount
+        cursor.execute(f"INSERT INTO {TABLE} ({TABLE}) VALUES ('optimize')")
+    return count
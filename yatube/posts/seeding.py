@@ -0,0 +1,231 @@
+"""Синтетические данные для бенчмарков и профилирования.
+
+Распределения похожи на настоящие: активность авторов подчиняется
+степенному закону (несколько авторов пишут большую часть постов),
+число подписок у пользователей — с тяжёлым хвостом, а подписываются
+в основном на «знаменитостей». Комментарии чаще достаются свежим
+постам. При одном и том же ``seed`` данные совпадают.
+
+Посты, комментарии и подписки пишутся пачками через ``executemany``,
+минуя слой моделей; у постов явные id подряд, поэтому ссылки на них
+выбираются арифметикой, без списков id в памяти.
+Тексты собираются из заранее созданного Faker набора предложений:
+вызывать Faker на каждую из миллионов строк слишком долго.
+Производные таблицы (ленты, счётчики, поисковый индекс) и статистика
+планировщика пересчитываются в конце целиком, сигналы при вставке не
+срабатывают.
+"""
+import bisect
+import itertools
+import random
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from faker import Faker
+
+from . import counts, feed, search
+from .models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+SENTENCES = 2000
+
+
+class Seeder:
+    """Генератор набора данных; параметры — размеры и форма графа."""
+
+    def __init__(self, users=100, groups=10, posts=1000, comments=None,
+                 follows=20, celebrities=None, activity=1.2,
+                 popularity=1.1, seed=0, batch_size=5000, progress=None):
+        self.users = max(users, 2)
+        self.groups = groups
+        self.posts = posts
+        self.comments = posts if comments is None else comments
+        self.follows = follows
+        self.celebrities = (
+            max(self.users // 1000, 1) if celebrities is None
+            else celebrities
+        )
+        self.batch_size = batch_size
+        self.progress = progress
+        self.rng = random.Random(seed)
+        self.faker = Faker('ru_RU')
+        self.faker.seed_instance(seed)
+        self.sentences = [
+            self.faker.sentence(nb_words=12) for _ in range(SENTENCES)
+        ]
+        # Вес i-го пользователя как автора и как цели подписки. Порядок
+        # популярности не совпадает с порядком активности: иначе самые
+        # плодовитые авторы попадали бы во все ленты сразу.
+        self.activity = self.cumulative(activity)
+        self.popularity = self.cumulative(popularity)
+        self.popular = list(range(self.users))
+        self.rng.shuffle(self.popular)
+        self.now = timezone.now()
+        self.date = connection.ops.adapt_datetimefield_value
+
+    def cumulative(self, exponent):
+        return list(itertools.accumulate(
+            1 / (rank + 1) ** exponent for rank in range(self.users)
+        ))
+
+    def pick(self, weights):
+        """Номер пользователя по накопленным весам."""
+        point = self.rng.random() * weights[-1]
+        return bisect.bisect_left(weights, point)
+
+    def text(self, sentences):
+        return ' '.join(
+            self.rng.choice(self.sentences) for _ in range(sentences)
+        )
+
+    def insert(self, model, rows, total, columns=None):
+        """Вставить строки пачками: объекты моделей через bulk_create,
+        кортежи ``columns`` — через executemany без слоя моделей."""
+        if columns:
+            quote = connection.ops.quote_name
+            sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+                quote(model._meta.db_table),
+                ', '.join(quote(column) for column in columns),
+                ', '.join(['%s'] * len(columns)),
+            )
+        done = 0
+        batch = list(itertools.islice(rows, self.batch_size))
+        while batch:
+            with transaction.atomic():
+                if columns:
+                    with connection.cursor() as cursor:
+                        cursor.executemany(sql, batch)
+                else:
+                    model.objects.bulk_create(batch)
+            done += len(batch)
+            if self.progress:
+                self.progress(f'{model._meta.model_name}: {done}/{total}')
+            batch = list(itertools.islice(rows, self.batch_size))
+        return done
+
+    def first_id(self, model):
+        return (model.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+
+    def run(self):
+        """Заполнить базу; вернуть читателя с подписками."""
+        self.user_base = self.first_id(User)
+        self.group_base = self.first_id(Group)
+        self.post_base = self.first_id(Post)
+        self.insert(User, self.make_users(), self.users)
+        self.insert(Group, self.make_groups(), self.groups)
+        self.insert(Post, self.make_posts(), self.posts, (
+            'id', 'text', 'pub_date', 'author_id', 'group_id', 'image',
+            'comments_count', 'updated_at',
+        ))
+        self.insert(Comment, self.make_comments(), self.comments, (
+            'post_id', 'author_id', 'text', 'created',
+        ))
+        follows = self.insert(
+            Follow, self.make_follows(), self.users * self.follows,
+            ('user_id', 'author_id'),
+        )
+        self.finish(follows)
+        return User.objects.get(pk=self.user_base)
+
+    def make_users(self):
+        for number in range(self.users):
+            yield User(
+                pk=self.user_base + number,
+                username=f'{self.faker.user_name()}{number}',
+                first_name=self.faker.first_name(),
+                last_name=self.faker.last_name(),
+                password='!',
+                date_joined=self.now,
+            )
+
+    def make_groups(self):
+        for number in range(self.groups):
+            yield Group(
+                pk=self.group_base + number,
+                title=self.faker.catch_phrase()[:200],
+                slug=f'group-{self.group_base + number}',
+                description=self.text(2),
+            )
+
+    def make_posts(self):
+        # Посты идут по времени: чем больше id, тем новее
+        start = self.now - timedelta(minutes=self.posts)
+        for number in range(self.posts):
+            group = self.rng.randrange(self.groups + 1)
+            published = self.date(start + timedelta(minutes=number))
+            yield (
+                self.post_base + number,
+                self.text(self.rng.randint(1, 8)),
+                published,
+                self.user_base + self.pick(self.activity),
+                self.group_base + group if group < self.groups else None,
+                '',
+                0,
+                published,
+            )
+
+    def make_comments(self):
+        if not self.posts:
+            return
+        start = self.now - timedelta(minutes=self.posts)
+        for _ in range(self.comments):
+            # Свежие посты комментируют чаще
+            number = self.posts - 1 - int(self.posts * self.rng.random() ** 3)
+            created = start + timedelta(
+                minutes=number + self.rng.random() * 60
+            )
+            yield (
+                self.post_base + number,
+                self.user_base + self.pick(self.activity),
+                self.text(1),
+                self.date(min(created, self.now)),
+            )
+
+    def make_follows(self):
+        for number in range(self.users):
+            # Длинный хвост: большинство подписано на немногих
+            wanted = min(
+                int(self.rng.paretovariate(1.5) * self.follows / 3),
+                self.users - 1,
+            )
+            if number == 0:
+                wanted = min(max(wanted, 50), self.users - 1)
+            authors = set(self.popular[:min(self.celebrities, wanted)])
+            # Редких авторов можно выбирать долго: число попыток ограничено
+            for _ in range(wanted * 4):
+                if len(authors) >= wanted:
+                    break
+                authors.add(self.popular[self.pick(self.popularity)])
+            authors.discard(number)
+            for author in sorted(authors):
+                yield self.user_base + number, self.user_base + author
+
+    def finish(self, follows):
+        models = [User, Group, Post]
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), models):
+                cursor.execute(sql)
+        with transaction.atomic():
+            feed.fill(Follow.objects.filter(user_id__gte=self.user_base))
+        call_command(
+            'repair_counters', batch_size=self.batch_size, stdout=StringIO()
+        )
+        with transaction.atomic():
+            search.rebuild()
+        counts.analyze()
+
+
+def seed(posts=1000, seed=0, batch_size=1000):
+    """Небольшой набор для бенчмарка: размер задаётся числом постов."""
+    users = max(posts // 20, 10)
+    return Seeder(
+        users=users, groups=max(users // 10, 1), posts=posts,
+        follows=6, seed=seed, batch_size=batch_size,
+    ).run()
@@ -0,0 +1,161 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import counters, feed, generations, lookups, search
+from .models import AuthorCounters, Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+def bump_post(post, *extra):
+    generations.bump(
+        generations.POSTS,
+        generations.group(post.group_id),
+        generations.author(post.author_id),
+        generations.post(post.id),
+        *extra
+    )
+
+
+@receiver(pre_save, sender=User)
+def remember_name(sender, instance, raw=False, update_fields=None,
+                  **kwargs):
+    instance._previous_name = None
+    instance._previous_username = None
+    if instance.pk and not raw and update_fields != frozenset({'last_login'}):
+        previous = (
+            User.objects.filter(pk=instance.pk)
+            .values_list('first_name', 'last_name', 'username').first()
+        )
+        if previous:
+            instance._previous_name = previous[:2]
+            instance._previous_username = previous[2]
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, raw=False, update_fields=None,
+               **kwargs):
+    if raw:
+        return
+    if update_fields != frozenset({'last_login'}):
+        lookups.forget(
+            'user', instance.username,
+            getattr(instance, '_previous_username', None),
+        )
+    if created:
+        AuthorCounters.objects.get_or_create(user=instance)
+    elif update_fields != frozenset({'last_login'}):
+        # Имя автора выводится в карточках всех лент
+        generations.bump(generations.POSTS, generations.author(instance.id))
+        previous = getattr(instance, '_previous_name', None)
+        if previous and previous != (instance.first_name, instance.last_name):
+            Post.objects.filter(author_id=instance.id).update(
+                updated_at=timezone.now()
+            )
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    lookups.forget('user', instance.username)
+
+
+@receiver(pre_save, sender=Group)
+def remember_slug(sender, instance, raw=False, **kwargs):
+    # Запись кеша по старому slug тоже нужно стереть
+    instance._previous_slug = None
+    if instance.pk and not raw:
+        instance._previous_slug = (
+            Group.objects.filter(pk=instance.pk)
+            .values_list('slug', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    lookups.forget('group', instance.slug, instance._previous_slug)
+    generations.bump(generations.group(instance.id))
+    if instance._previous_slug not in (None, instance.slug):
+        # Ссылка на группу выводится в карточках её постов
+        instance.posts.update(updated_at=timezone.now())
+        generations.bump(generations.POSTS)
+
+
+@receiver(post_delete, sender=Group)
+def group_deleted(sender, instance, **kwargs):
+    lookups.forget('group', instance.slug)
+
+
+@receiver(pre_save, sender=Post)
+def remember_group(sender, instance, raw=False, **kwargs):
+    # При переносе поста в другую группу устаревает и старая группа
+    instance._previous_group_id = None
+    if instance.pk and not raw:
+        instance._previous_group_id = (
+            Post.objects.filter(pk=instance.pk)
+            .values_list('group_id', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        counters.change(instance.author_id, posts_count=1)
+        feed.fan_out(instance)
+    search.index(instance)
+    bump_post(instance, generations.group(instance._previous_group_id))
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    counters.change(instance.author_id, posts_count=-1)
+    feed.retract(instance)
+    search.remove(instance.id)
+    bump_post(instance)
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.change_comments(instance.post_id, 1)
+        if instance.post_id is not None:
+            bump_post(instance.post)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    counters.change_comments(instance.post_id, -1)
+    post = Post.objects.filter(pk=instance.post_id).first()
+    if post is not None:
+        bump_post(post)
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.change(instance.author_id, followers_count=1)
+        counters.change(instance.user_id, following_count=1)
+        feed.backfill(instance.user, instance.author)
+        # Счётчики подписок видны в профилях обоих пользователей
+        generations.bump(
+            generations.follow(instance.user_id),
+            generations.author(instance.author_id),
+            generations.author(instance.user_id),
+        )
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    counters.change(instance.author_id, followers_count=-1)
+    counters.change(instance.user_id, following_count=-1)
+    feed.prune(instance.user_id, instance.author_id)
+    generations.bump(
+        generations.follow(instance.user_id),
+        generations.author(instance.author_id),
+        generations.author(instance.user_id),
+    )
@@ -0,0 +1,48 @@
+from django.core.cache import cache
+from django.test import Client, TestCase
+
+from .. import benchmark
+from ..seeding import seed
+
+
+class BenchmarkTests(TestCase):
+    def test_run_reports_every_scenario(self):
+        """Прогон даёт задержки, запросы и размер для каждой страницы."""
+        cache.clear()
+        reader = seed(posts=40)
+        client = Client()
+        client.force_login(reader)
+        results = benchmark.run(client, reader, repeat=3, warmup=0)
+        self.assertEqual(
+            set(results), {name for name, *_ in benchmark.scenarios(reader)}
+        )
+        for name, row in results.items():
+            with self.subTest(name=name):
+                self.assertLessEqual(row['p50'], row['p95'])
+                self.assertLessEqual(row['p95'], row['p99'])
+                self.assertGreater(row['queries'], 0)
+                self.assertTrue(all(status < 400 for status in row['status']))
+
+    def test_compare_flags_regressions(self):
+        """Рост p95 сверх допуска и лишние запросы — регрессии."""
+        baseline = {
+            'fast': {'p95': 10.0, 'queries': 3},
+            'slow': {'p95': 10.0, 'queries': 3},
+            'noisy': {'p95': 1.0, 'queries': 3},
+        }
+        results = {
+            'fast': {'p95': 11.0, 'queries': 3},
+            'slow': {'p95': 15.0, 'queries': 4},
+            'noisy': {'p95': 1.5, 'queries': 3},
+            'new': {'p95': 100.0, 'queries': 9},
+        }
+        regressions = benchmark.compare(results, baseline, tolerance=0.2)
+        self.assertEqual(len(regressions), 2)
+        self.assertTrue(all(line.startswith('slow') for line in regressions))
+
+    def test_percentile(self):
+        """Перцентиль считается по ближайшему рангу."""
+        values = list(range(1, 101))
+        self.assertEqual(benchmark.percentile(values, 0.5), 50)
+        self.assertEqual(benchmark.percentile(values, 0.99), 99)
+        self.assertEqual(benchmark.percentile([7], 0.95), 7)
@@ -0,0 +1,91 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from ..models import AuthorCounters, Comment, Follow, Post, User
+
+
+class CountersTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+
+    def counters(self, user):
+        return AuthorCounters.objects.get(user=user)
+
+    def test_post_counter(self):
+        """Создание и удаление поста меняют счётчик автора."""
+        post = Post.objects.create(text='Пост', author=self.author)
+        self.assertEqual(self.counters(self.author).posts_count, 1)
+        post.delete()
+        self.assertEqual(self.counters(self.author).posts_count, 0)
+
+    def test_comment_counter(self):
+        """Комментарии считаются в посте."""
+        post = Post.objects.create(text='Пост', author=self.author)
+        comment = Comment.objects.create(
+            post=post, author=self.reader, text='Комментарий'
+        )
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        comment.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+
+    def test_drifted_counters_do_not_break_delete(self):
+        """Удаление при разошедшихся нулевых счётчиках не падает."""
+        post = Post.objects.create(text='Пост', author=self.author)
+        comment = Comment.objects.create(
+            post=post, author=self.reader, text='Комментарий'
+        )
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        AuthorCounters.objects.filter(
+            user__in=[self.author, self.reader]
+        ).update(posts_count=0, followers_count=0, following_count=0)
+        Post.objects.filter(pk=post.pk).update(comments_count=0)
+        comment.delete()
+        follow.delete()
+        post.delete()
+        self.assertEqual(self.counters(self.author).posts_count, 0)
+        self.assertEqual(self.counters(self.author).followers_count, 0)
+        self.assertEqual(self.counters(self.reader).following_count, 0)
+
+    def test_follow_counters(self):
+        """Подписка меняет счётчики обоих пользователей."""
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(self.counters(self.author).followers_count, 1)
+        self.assertEqual(self.counters(self.reader).following_count, 1)
+        follow.delete()
+        self.assertEqual(self.counters(self.author).followers_count, 0)
+        self.assertEqual(self.counters(self.reader).following_count, 0)
+
+    def test_missing_row_is_recounted(self):
+        """Счётчики без строки пересчитываются при первом изменении."""
+        AuthorCounters.objects.filter(user=self.author).delete()
+        Post.objects.bulk_create(
+            [Post(text='Пост', author=self.author) for _ in range(3)]
+        )
+        Post.objects.create(text='Пост', author=self.author)
+        self.assertEqual(self.counters(self.author).posts_count, 4)
+
+    def test_repair_command(self):
+        """repair_counters исправляет разошедшиеся счётчики."""
+        post = Post.objects.create(text='Пост', author=self.author)
+        Comment.objects.bulk_create(
+            [
+                Comment(post=post, author=self.reader, text='Комментарий')
+                for _ in range(2)
+            ]
+        )
+        Follow.objects.bulk_create(
+            [Follow(user=self.reader, author=self.author)]
+        )
+        AuthorCounters.objects.filter(user=self.reader).delete()
+        call_command('repair_counters', batch_size=1, stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 2)
+        self.assertEqual(self.counters(self.author).followers_count, 1)
+        self.assertEqual(self.counters(self.reader).following_count, 1)
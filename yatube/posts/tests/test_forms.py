@@ -1,10 +1,14 @@
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from ..forms import PostForm
 from ..models import Post, Group, User, Comment
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.conf import settings
 import tempfile
 import shutil
+from io import BytesIO
+from PIL import Image
+from core import metrics
 
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
@@ -195,3 +199,71 @@ class CommentFormsTest(TestCase):
             follow=True,
         )
         self.assertEqual(self.post.comments.count(), comments_count)
+
+
+class PostImageNormalizationTests(TestCase):
+    @staticmethod
+    def get_upload(name, size, format='JPEG', **options):
+        buffer = BytesIO()
+        Image.new('RGB', size, (200, 30, 30)).save(buffer, format, **options)
+        return SimpleUploadedFile(
+            name, buffer.getvalue(), content_type=Image.MIME[format]
+        )
+
+    @staticmethod
+    def saved_bytes():
+        return metrics.registry.values.get(
+            ('yatube_image_bytes_saved_total', (('format', 'JPEG'),)), 0
+        )
+
+    def test_large_image_downscaled_without_exif(self):
+        """Большое фото уменьшается, перекодируется и теряет EXIF."""
+        exif = Image.Exif()
+        exif[0x010F] = 'Phone'
+        upload = self.get_upload(
+            'photo.jpeg', (4000, 3000), quality=100, exif=exif.tobytes()
+        )
+        saved_bytes = self.saved_bytes()
+        with self.assertLogs('posts.images', 'INFO'):
+            form = PostForm(data={'text': 'Фото'}, files={'image': upload})
+            self.assertTrue(form.is_valid(), form.errors)
+        image = form.cleaned_data['image']
+        self.assertLess(image.size, upload.size)
+        self.assertEqual(
+            self.saved_bytes() - saved_bytes, upload.size - image.size
+        )
+        self.assertEqual(image.name, 'photo.jpg')
+        saved = Image.open(image)
+        self.assertEqual(saved.size, (1920, 1440))
+        self.assertEqual(saved.format, 'JPEG')
+        self.assertFalse(saved.getexif())
+
+    def test_small_image_kept(self):
+        """Небольшая картинка без метаданных сохраняется как есть."""
+        upload = self.get_upload('small.png', (50, 50), 'PNG')
+        form = PostForm(data={'text': 'Фото'}, files={'image': upload})
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertIs(form.cleaned_data['image'], upload)
+
+    @override_settings(POST_IMAGE_PASSTHROUGH_BYTES=100)
+    def test_original_kept_when_reencode_not_smaller(self):
+        """Оригинал остаётся, если перекодирование его не уменьшило."""
+        # Шум, сжатый с низким качеством: при обычном качестве он вырастет
+        buffer = BytesIO()
+        Image.effect_noise((64, 64), 100).convert('RGB').save(
+            buffer, 'JPEG', quality=5
+        )
+        upload = SimpleUploadedFile(
+            'noise.jpeg', buffer.getvalue(), content_type='image/jpeg'
+        )
+        form = PostForm(data={'text': 'Фото'}, files={'image': upload})
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertIs(form.cleaned_data['image'], upload)
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=100)
+    def test_decompression_bomb_rejected(self):
+        """Картинка с огромным числом пикселей отклоняется."""
+        upload = self.get_upload('bomb.png', (50, 50), 'PNG')
+        form = PostForm(data={'text': 'Фото'}, files={'image': upload})
+        self.assertFalse(form.is_valid())
+        self.assertIn('image', form.errors)
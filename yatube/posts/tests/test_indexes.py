@@ -0,0 +1,84 @@
+import re
+from unittest import skipUnless
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post, User
+from ..pagination import KeysetPaginator
+
+# Полный просмотр таблицы без индекса: «SCAN posts_post» или
+# «SCAN TABLE posts_post» в старых версиях SQLite.
+FULL_SCAN = re.compile(r'^SCAN (TABLE )?\w+$')
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Планы запросов SQLite')
+class QueryPlanTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание группы',
+        )
+        cls.post = Post.objects.create(
+            text='Тестовый пост',
+            author=cls.author,
+            group=cls.group,
+        )
+        Comment.objects.create(
+            post=cls.post, author=cls.reader, text='Комментарий'
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def test_views_use_indexes(self):
+        """Запросы страниц ленты идут по индексам и без сортировки."""
+        cursor = KeysetPaginator(Post.objects.all(), 10).encode_cursor(
+            self.post
+        )
+        pages = (
+            reverse('posts:index'),
+            reverse('posts:index') + f'?after={cursor}',
+            reverse('posts:index') + f'?before={cursor}',
+            reverse('posts:group_list', args=(self.group.slug,))
+            + f'?after={cursor}',
+            reverse('posts:group_list', args=(self.group.slug,)),
+            reverse('posts:profile', args=(self.author.username,)),
+            reverse('posts:post_detail', args=(self.post.id,)),
+            reverse('posts:follow_index'),
+        )
+        for page in pages:
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(page)
+            for query in queries.captured_queries:
+                sql = query['sql']
+                if not sql.startswith('SELECT') or 'posts_' not in sql:
+                    continue
+                if 'GROUP BY' in sql:
+                    # Агрегат «тяжёлых» авторов ленты кешируется.
+                    continue
+                for step in self.explain(sql):
+                    if step == 'SCAN subquery':
+                        # Обход подзапроса с LIMIT при подсчёте
+                        # записей (posts.counts); сам подзапрос —
+                        # по индексу.
+                        continue
+                    with self.subTest(page=page, sql=sql, step=step):
+                        self.assertNotIn('TEMP B-TREE', step)
+                        self.assertIsNone(FULL_SCAN.match(step))
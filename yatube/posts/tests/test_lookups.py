@@ -0,0 +1,92 @@
+from django.core.cache import cache
+from django.http import Http404
+from django.test import TestCase
+
+from core import metrics
+
+from .. import lookups
+from ..models import Group, User
+
+
+class LookupCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание группы',
+        )
+        cls.user = User.objects.create_user(
+            username='author', password='секрет', first_name='Анна'
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_repeat_lookups_use_cache(self):
+        """Повторный поиск группы и пользователя не ходит в базу."""
+        lookups.group_or_404('test-slug')
+        lookups.user_or_404('author')
+        with self.assertNumQueries(0):
+            self.assertEqual(lookups.group_or_404('test-slug'), self.group)
+            author = lookups.user_or_404('author')
+            self.assertEqual(author.get_full_name(), 'Анна')
+
+    def test_password_not_cached(self):
+        lookups.user('author')
+        cached = cache.get(lookups._key('user', 'author'))
+        self.assertNotIn('password', cached.__dict__)
+
+    def test_missing_keys_cached(self):
+        """Несуществующий адрес ищется в базе один раз."""
+        with self.assertNumQueries(1):
+            for _ in range(3):
+                with self.assertRaises(Http404):
+                    lookups.group_or_404('nobody')
+        Group.objects.create(title='Новая', slug='nobody', description='')
+        self.assertEqual(lookups.group('nobody').title, 'Новая')
+
+    def test_save_and_delete_invalidate(self):
+        lookups.group('test-slug')
+        lookups.user('author')
+        group = Group.objects.get(pk=self.group.pk)
+        group.title = 'Новое имя'
+        group.save()
+        user = User.objects.get(pk=self.user.pk)
+        user.first_name = 'Мария'
+        user.save()
+        self.assertEqual(lookups.group('test-slug').title, 'Новое имя')
+        self.assertEqual(lookups.user('author').first_name, 'Мария')
+        group.delete()
+        self.assertIsNone(lookups.group('test-slug'))
+
+    def test_renamed_keys_not_found(self):
+        """Старые slug и username после переименования не находятся."""
+        lookups.group('test-slug')
+        lookups.user('author')
+        lookups.user('writer')
+        group = Group.objects.get(pk=self.group.pk)
+        group.slug = 'renamed'
+        group.save()
+        user = User.objects.get(pk=self.user.pk)
+        user.username = 'writer'
+        user.save()
+        self.assertIsNone(lookups.group('test-slug'))
+        self.assertEqual(lookups.group('renamed'), self.group)
+        self.assertIsNone(lookups.user('author'))
+        self.assertEqual(lookups.user('writer'), self.user)
+
+    def test_hits_and_misses_counted(self):
+        def count(result):
+            return metrics.registry.values.get(
+                ('yatube_lookup_cache_total',
+                 (('model', 'group'), ('result', result))),
+                0,
+            )
+
+        hits, misses = count('hit'), count('miss')
+        lookups.group('test-slug')
+        lookups.group('test-slug')
+        self.assertEqual(count('hit') - hits, 1)
+        self.assertEqual(count('miss') - misses, 1)
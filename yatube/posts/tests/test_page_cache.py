@@ -0,0 +1,170 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from core import routers
+
+from ..models import Comment, Follow, Group, Post, User
+from ..page_cache import cache_anonymous_page
+
+
+class AnonymousPageCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание группы',
+        )
+        cls.post = Post.objects.create(
+            text='Тестовый пост', author=cls.user, group=cls.group
+        )
+        cls.pages = (
+            reverse('posts:index'),
+            reverse('posts:group_list', args=(cls.group.slug,)),
+            reverse('posts:profile', args=(cls.user.username,)),
+            reverse('posts:post_detail', args=(cls.post.id,)),
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def test_repeated_request_served_from_cache(self):
+        """Повторный анонимный запрос не рендерит шаблон."""
+        for page in self.pages:
+            with self.subTest(page=page):
+                first = self.guest_client.get(page)
+                self.assertIsNotNone(first.context)
+                second = self.guest_client.get(page)
+                self.assertIsNone(second.context)
+                self.assertEqual(first.content, second.content)
+                self.assertEqual(first['ETag'], second['ETag'])
+                self.assertIn('Cookie', second['Vary'])
+
+    def test_conditional_get_returns_304(self):
+        """If-None-Match даёт 304."""
+        for page in self.pages:
+            with self.subTest(page=page):
+                first = self.guest_client.get(page)
+                self.assertNotIn('Last-Modified', first)
+                response = self.guest_client.get(
+                    page, HTTP_IF_NONE_MATCH=first['ETag']
+                )
+                self.assertEqual(response.status_code, 304)
+
+    def test_edits_update_etag(self):
+        """Правка и удаление поста, переименование группы меняют ETag."""
+        post = Post.objects.create(
+            text='Второй пост', author=self.user, group=self.group
+        )
+        lists = self.pages[:3]
+        changes = (
+            (lambda: Post.objects.get(pk=post.pk).save(), lists),
+            (lambda: Post.objects.get(pk=post.pk).delete(), lists),
+            (lambda: Group.objects.get(pk=self.group.pk).save(), lists[1:2]),
+        )
+        for change, pages in changes:
+            etags = {page: self.guest_client.get(page)['ETag']
+                     for page in pages}
+            change()
+            for page in pages:
+                with self.subTest(page=page):
+                    response = self.guest_client.get(
+                        page, HTTP_IF_NONE_MATCH=etags[page]
+                    )
+                    self.assertEqual(response.status_code, 200)
+
+    def test_changes_update_etag(self):
+        """Новый пост и комментарий меняют ETag страниц."""
+        etags = {page: self.guest_client.get(page)['ETag']
+                 for page in self.pages}
+        post = Post.objects.create(
+            text='Новый пост', author=self.user, group=self.group
+        )
+        Comment.objects.create(post=self.post, author=self.user, text='Да')
+        for page in self.pages:
+            with self.subTest(page=page):
+                response = self.guest_client.get(
+                    page, HTTP_IF_NONE_MATCH=etags[page]
+                )
+                self.assertEqual(response.status_code, 200)
+                self.assertNotEqual(response['ETag'], etags[page])
+        self.assertContains(self.guest_client.get(self.pages[0]), post.text)
+
+    def test_follow_updates_profiles(self):
+        """Подписка меняет счётчики в профилях обоих пользователей."""
+        reader = User.objects.create_user(username='reader')
+        pages = (
+            reverse('posts:profile', args=(self.user.username,)),
+            reverse('posts:profile', args=(reader.username,)),
+        )
+        for page in pages:
+            self.guest_client.get(page)
+        follow = Follow.objects.create(user=reader, author=self.user)
+        self.assertContains(self.guest_client.get(pages[0]), 'Подписчиков: 1')
+        self.assertContains(self.guest_client.get(pages[1]), 'подписок: 1')
+        follow.delete()
+        self.assertContains(self.guest_client.get(pages[0]), 'Подписчиков: 0')
+        self.assertContains(self.guest_client.get(pages[1]), 'подписок: 0')
+
+    def test_post_page_follows_author(self):
+        """Страница поста видит новый пост и новое имя автора."""
+        page = reverse('posts:post_detail', args=(self.post.id,))
+        self.assertContains(self.guest_client.get(page), 'Всего постов автора')
+        Post.objects.create(text='Ещё пост', author=self.user)
+        response = self.guest_client.get(page)
+        self.assertEqual(response.context['counters'].posts_count, 2)
+        author = User.objects.get(pk=self.user.pk)
+        author.first_name = 'Новое'
+        author.last_name = 'Имя'
+        author.save()
+        self.assertContains(self.guest_client.get(page), 'Новое Имя')
+
+    @override_settings(STAMPEDE_WAIT=0)
+    def test_stale_fragment_not_stored(self):
+        """Страница с устаревшим фрагментом не попадает в кеш страниц."""
+        page = self.pages[0]
+        self.guest_client.get(page)
+        post = Post.objects.create(text='Новый пост', author=self.user)
+        # Фрагмент пересчитывает «другой запрос»: отдаётся прежняя версия
+        with mock.patch.object(cache, 'add', return_value=False):
+            response = self.guest_client.get(page)
+        self.assertNotContains(response, post.text)
+        self.assertNotIn('ETag', response)
+        response = self.guest_client.get(page)
+        self.assertContains(response, post.text)
+        self.assertIn('ETag', response)
+
+    @override_settings(DATABASE_REPLICAS=['replica0'])
+    def test_cached_page_rendered_from_primary(self):
+        """Страница для кеша не читается с отстающей реплики."""
+        @cache_anonymous_page(lambda request: ('replica-test',))
+        def view(request):
+            alias = routers.ReplicaRouter().db_for_read(Post)
+            return HttpResponse(alias)
+
+        token = routers.begin(True)
+        try:
+            response = view(RequestFactory().get('/replica-test/'))
+        finally:
+            routers.end(token)
+        self.assertEqual(response.content, b'default')
+
+    def test_authenticated_user_bypasses_cache(self):
+        """Авторизованный пользователь всегда получает свежую страницу."""
+        authorized_client = Client()
+        authorized_client.force_login(self.user)
+        for page in self.pages:
+            with self.subTest(page=page):
+                self.guest_client.get(page)
+                response = authorized_client.get(page)
+                self.assertIsNotNone(response.context)
+                self.assertNotIn('ETag', response)
+                self.assertIn('Cookie', response['Vary'])
+                self.assertIn('private', response['Cache-Control'])
@@ -0,0 +1,97 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .. import urls
+from ..models import Comment, Follow, Group, Post, User
+
+# Бюджет запросов к базе на один GET авторизованного пользователя.
+# Сессия и пользователь — два запроса на каждой странице. Кеш пуст,
+# поэтому списки ещё и считают записи (posts.counts), а профиль читает
+# автора и его счётчики отдельно: автор потом берётся из кеша
+# (posts.lookups).
+QUERY_BUDGETS = {
+    'posts:index': 4,
+    'posts:group_list': 5,
+    'posts:profile': 5,
+    'posts:search': 3,
+    'posts:post_detail': 4,
+    'posts:comments': 4,
+    'posts:create': 3,
+    'posts:edit': 4,
+    'posts:add_comment': 3,
+    'posts:follow_index': 5,
+    'posts:profile_follow': 4,
+    'posts:profile_unfollow': 7,
+}
+
+
+class QueryBudgetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание группы',
+        )
+        authors = [
+            User.objects.create_user(username=f'author{i}')
+            for i in range(5)
+        ]
+        cls.author = authors[0]
+        for author in authors:
+            Follow.objects.create(user=cls.reader, author=author)
+        for i in range(12):
+            post = Post.objects.create(
+                text=f'Тестовый пост {i}',
+                author=authors[i % len(authors)],
+                group=cls.group,
+            )
+        cls.post = Post.objects.create(
+            text='Пост с комментариями', author=cls.reader, group=cls.group
+        )
+        for author in authors:
+            Comment.objects.create(
+                post=cls.post, author=author, text='Комментарий'
+            )
+        cls.arguments = {
+            'group_list': (cls.group.slug,),
+            'profile': (cls.author.username,),
+            'post_detail': (cls.post.id,),
+            'comments': (cls.post.id,),
+            'edit': (cls.post.id,),
+            'add_comment': (cls.post.id,),
+            'profile_follow': (post.author.username,),
+            'profile_unfollow': (post.author.username,),
+        }
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def assertQueryBudget(self, url, budget):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        self.assertLessEqual(
+            len(queries), budget,
+            '\n'.join(query['sql'] for query in queries.captured_queries)
+        )
+
+    def test_every_url_has_budget(self):
+        """У каждого адреса posts: объявлен бюджет запросов."""
+        for pattern in urls.urlpatterns:
+            with self.subTest(name=pattern.name):
+                self.assertIn(f'posts:{pattern.name}', QUERY_BUDGETS)
+
+    def test_urls_within_budget(self):
+        """Страницы укладываются в объявленный бюджет запросов."""
+        for pattern in urls.urlpatterns:
+            name = f'posts:{pattern.name}'
+            url = reverse(name, args=self.arguments.get(pattern.name))
+            with self.subTest(name=name):
+                self.assertQueryBudget(url, QUERY_BUDGETS[name])
@@ -0,0 +1,113 @@
+import tempfile
+
+from django.contrib.auth.models import update_last_login
+from django.core.cache import cache, caches
+from django.db import transaction
+from django.test import TransactionTestCase, override_settings
+
+from ..models import Group, Post, User
+
+
+# В TestCase всё идёт внутри транзакции с записью, где кеш отключён
+class QueryCacheTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        caches['queryset'].clear()
+        self.user = User.objects.create_user(username='author')
+        self.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        self.post = Post.objects.create(
+            text='Первый пост', author=self.user, group=self.group
+        )
+
+    def listing(self):
+        return Post.objects.select_related('author', 'group').cached()
+
+    def test_repeat_query_served_from_cache(self):
+        """Тот же SQL второй раз не доходит до базы."""
+        self.assertEqual(list(self.listing()), [self.post])
+        with self.assertNumQueries(0):
+            posts = list(self.listing())
+        self.assertEqual(posts[0].author.username, 'author')
+        with self.assertNumQueries(1):
+            list(Post.objects.select_related('author', 'group'))
+
+    def test_writes_invalidate(self):
+        """Любая запись в задействованную таблицу сбрасывает результат."""
+        list(self.listing())
+        Post.objects.create(text='Второй пост', author=self.user)
+        self.assertEqual(len(self.listing()), 2)
+        # update() не шлёт сигналов, но тоже виден
+        Post.objects.update(text='Новый текст')
+        self.assertEqual(self.listing()[0].text, 'Новый текст')
+        User.objects.update(first_name='Анна')
+        self.assertEqual(self.listing()[0].author.first_name, 'Анна')
+
+    def test_row_shape_in_key(self):
+        query = Post.objects.cached()
+        self.assertEqual(
+            list(query.values_list('text', flat=True)), ['Первый пост']
+        )
+        self.assertEqual(list(query.values_list('text')), [('Первый пост',)])
+
+    def test_untracked_tables_not_cached(self):
+        """Запросы к таблицам без отслеживания записей не кешируются."""
+        def query():
+            return Post.objects.select_related('author__counters').cached()
+
+        list(query())
+        with self.assertNumQueries(1):
+            list(query())
+
+    @override_settings(QUERYSET_CACHE_EXCLUDE=['posts.Group'])
+    def test_excluded_model_not_cached(self):
+        list(self.listing())
+        with self.assertNumQueries(1):
+            list(self.listing())
+        list(Post.objects.cached())
+        with self.assertNumQueries(0):
+            list(Post.objects.cached())
+
+    def test_large_results_not_cached(self):
+        """Результат больше MAX_ENTRY бэкенда кеша не сохраняется."""
+        with tempfile.TemporaryDirectory() as directory:
+            default = {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            }
+            backend = {
+                'BACKEND': 'core.cache.MmapCache',
+                'LOCATION': f'{directory}/queryset',
+                'OPTIONS': {'SIZE': 64 * 1024, 'SLOTS': 64},
+            }
+            small = {**backend, 'OPTIONS': {
+                **backend['OPTIONS'], 'MAX_ENTRY': 100,
+            }}
+            with override_settings(CACHES={'default': default,
+                                           'queryset': small}):
+                list(self.listing())
+                with self.assertNumQueries(1):
+                    list(self.listing())
+            with override_settings(CACHES={'default': default,
+                                           'queryset': backend}):
+                list(self.listing())
+                with self.assertNumQueries(0):
+                    list(self.listing())
+
+    def test_login_does_not_invalidate(self):
+        """Время входа пользователя не сбрасывает списки постов."""
+        list(self.listing())
+        update_last_login(None, self.user)
+        with self.assertNumQueries(0):
+            list(self.listing())
+
+    def test_transaction_with_writes_not_cached(self):
+        """Незафиксированные данные не попадают в кеш."""
+        with transaction.atomic():
+            Post.objects.create(text='Черновик', author=self.user)
+            self.assertEqual(len(self.listing()), 2)
+            with self.assertNumQueries(1):
+                list(self.listing())
+        self.assertEqual(len(self.listing()), 2)
+        with self.assertNumQueries(0):
+            list(self.listing())
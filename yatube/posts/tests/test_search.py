@@ -0,0 +1,98 @@
+from io import StringIO
+
+from django.contrib.admin.sites import site
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, RequestFactory, TestCase
+from django.urls import reverse
+
+from .. import search
+from ..models import Post, User
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+        cls.relevant = Post.objects.create(
+            text='Котики, котики и ещё раз котики', author=cls.user
+        )
+        cls.other = Post.objects.create(
+            text='Про котиков и собак', author=cls.user
+        )
+        Post.objects.create(text='Только собаки', author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def search(self, query, **params):
+        response = self.guest_client.get(
+            reverse('posts:search'), {'q': query, **params}
+        )
+        return response.context['page_obj']
+
+    def test_results_ranked(self):
+        """Поиск находит посты по префиксу слова и ранжирует их."""
+        self.assertEqual(
+            list(self.search('КОТИК')), [self.relevant, self.other]
+        )
+        self.assertEqual(list(self.search('котик собак')), [self.other])
+        self.assertEqual(list(self.search('"*)(')), [])
+
+    def test_index_joined_once(self):
+        """Ранжирование соединяет таблицу индекса, а не ищет на пост."""
+        sql = str(search.ranked(Post.objects.all(), 'котик').query)
+        self.assertEqual(sql.count('MATCH'), 1)
+        self.assertNotIn('SELECT rank', sql)
+
+    def test_index_follows_changes(self):
+        """Правка и удаление поста сразу видны в поиске."""
+        post = Post.objects.get(pk=self.other.pk)
+        post.text = 'Про хомяков'
+        post.save()
+        self.assertEqual(list(self.search('хомяк')), [post])
+        self.assertEqual(list(self.search('котик')), [self.relevant])
+        Post.objects.filter(pk=self.relevant.pk).delete()
+        self.assertEqual(list(self.search('котик')), [])
+
+    def test_cursor_pages(self):
+        """Результаты листаются курсорами, запрос сохраняется в ссылках."""
+        Post.objects.bulk_create(
+            Post(text=f'Хомяк номер {i}', author=self.user)
+            for i in range(12)
+        )
+        search.rebuild()
+        response = self.guest_client.get(
+            reverse('posts:search'), {'q': 'хомяк'}
+        )
+        first = response.context['page_obj']
+        self.assertContains(response, 'q=%D1%85%D0%BE%D0%BC%D1%8F%D0%BA&amp;')
+        second = self.search('хомяк', after=first.paginator.next_cursor)
+        ids = {post.id for post in list(first) + list(second)}
+        self.assertEqual(len(first), 10)
+        self.assertEqual(len(ids), 12)
+
+    def test_admin_uses_index(self):
+        """Поиск в админке идёт через FTS5, а не LIKE."""
+        request = RequestFactory().get('/admin/posts/post/')
+        admin = site._registry[Post]
+        queryset, _ = admin.get_search_results(
+            request, Post.objects.all(), 'собак'
+        )
+        sql = str(queryset.query)
+        self.assertIn(search.TABLE, sql)
+        self.assertNotIn('LIKE', sql)
+        self.assertEqual(queryset.count(), 2)
+
+    def test_rebuild_command(self):
+        """Команда перестраивает индекс по существующим постам."""
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {search.TABLE}')
+        self.assertEqual(list(self.search('собак')), [])
+        out = StringIO()
+        call_command('rebuild_search_index', stdout=out)
+        self.assertIn('3', out.getvalue())
+        self.assertEqual(len(self.search('собак')), 2)
@@ -0,0 +1,118 @@
+import shutil
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend
+
+from .. import thumbnails
+from ..models import Post, User
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='TestUser')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    @override_settings(THUMBNAIL_WORKERS=0)
+    def test_thumbnails_generated_outside_template(self):
+        """Миниатюры поста готовятся заранее и попадают в страницу."""
+        post = Post.objects.create(
+            text='Пост с картинкой',
+            author=self.user,
+            image=SimpleUploadedFile('first.gif', SMALL_GIF, 'image/gif'),
+        )
+        thumbnails.schedule(post.image.name)
+        self.assertTrue(
+            default.backend.get_ready_thumbnail(
+                post.image, '960x339', crop='center', upscale=True
+            )
+        )
+        response = self.authorized_client.get(
+            reverse('posts:post_detail', args=(post.id,))
+        )
+        self.assertContains(response, '<img class="card-img my-2"')
+
+    def test_ready_thumbnail_name_matches_sorl(self):
+        """Имя готовой миниатюры совпадает с именем, которое даёт sorl.
+
+        ``get_ready_thumbnail`` повторяет закрытые шаги
+        ``ThumbnailBackend.get_thumbnail``; тест ловит расхождение
+        после обновления sorl-thumbnail.
+        """
+        post = Post.objects.create(
+            text='Пост с картинкой',
+            author=self.user,
+            image=SimpleUploadedFile('third.gif', SMALL_GIF, 'image/gif'),
+        )
+        for geometry, options in (
+            *settings.POST_THUMBNAILS,
+            ('100x100', {}),
+            ('50', {'format': 'PNG', 'quality': 70}),
+        ):
+            with self.subTest(geometry=geometry, options=options):
+                expected = ThumbnailBackend().get_thumbnail(
+                    post.image, geometry, **options
+                )
+                ready = default.backend.get_ready_thumbnail(
+                    post.image, geometry, **options
+                )
+                self.assertIsNotNone(ready)
+                self.assertEqual(ready.name, expected.name)
+
+    def test_placeholder_until_ready(self):
+        """Пока миниатюры нет, страница показывает заглушку."""
+        post = Post.objects.create(
+            text='Пост с картинкой',
+            author=self.user,
+            image=SimpleUploadedFile('second.gif', SMALL_GIF, 'image/gif'),
+        )
+        with mock.patch('posts.thumbnails.schedule') as schedule:
+            response = self.authorized_client.get(
+                reverse('posts:post_detail', args=(post.id,))
+            )
+        schedule.assert_called_once_with(post.image.name)
+        self.assertContains(response, 'aspect-ratio: 960 / 339')
+        self.assertNotContains(response, '<img class="card-img my-2"')
+
+    def test_card_redrawn_when_ready(self):
+        """Готовая миниатюра заменяет заглушку в закешированной карточке."""
+        post = Post.objects.create(
+            text='Пост с картинкой',
+            author=self.user,
+            image=SimpleUploadedFile('fourth.gif', SMALL_GIF, 'image/gif'),
+        )
+        with mock.patch('posts.thumbnails.schedule'):
+            response = self.authorized_client.get(reverse('posts:index'))
+        self.assertContains(response, 'aspect-ratio: 960 / 339')
+        thumbnails.generate(post.image.name)
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertContains(response, '<img class="card-img my-2"')
+        self.assertNotContains(response, 'aspect-ratio: 960 / 339')
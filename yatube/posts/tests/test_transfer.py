@@ -0,0 +1,79 @@
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from ..models import AuthorCounters, Comment, FeedItem, Follow, Group, Post
+from ..models import User
+
+
+class TransferTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа', slug='test-slug', description='Описание'
+        )
+        for i in range(3):
+            post = Post.objects.create(
+                text=f'Пост {i}', author=cls.author, group=cls.group
+            )
+        Comment.objects.create(post=post, author=cls.reader, text='Да')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def export(self):
+        out = StringIO()
+        call_command('export_yatube', stdout=out, stderr=StringIO())
+        return out.getvalue()
+
+    def load(self, dump):
+        with tempfile.NamedTemporaryFile('w', suffix='.ndjson') as file:
+            file.write(dump)
+            file.flush()
+            call_command(
+                'import_yatube', file.name, batch_size=2,
+                stdout=StringIO(), stderr=StringIO(),
+            )
+
+    def test_export_lines(self):
+        """Выгрузка — по строке JSON на запись, в порядке зависимостей."""
+        lines = self.export().splitlines()
+        self.assertEqual(len(lines), 2 + 1 + 3 + 1 + 1)
+        self.assertIn('"model": "user"', lines[0])
+        self.assertIn('"model": "follow"', lines[-1])
+
+    def test_round_trip_into_empty_database(self):
+        """Загрузка в пустую базу восстанавливает данные и производное."""
+        dump = self.export()
+        dates = list(Post.objects.values_list('pub_date', flat=True))
+        User.objects.all().delete()
+        Group.objects.all().delete()
+        self.load(dump)
+        self.assertEqual(
+            list(Post.objects.values_list('pub_date', flat=True)), dates
+        )
+        author = User.objects.get(username='author')
+        self.assertEqual(author.counters.posts_count, 3)
+        self.assertEqual(author.counters.followers_count, 1)
+        self.assertEqual(
+            FeedItem.objects.filter(user__username='reader').count(), 3
+        )
+        self.assertEqual(Post.objects.filter(comments_count=1).count(), 1)
+
+    def test_existing_users_and_groups_merged(self):
+        """Повторная загрузка не дублирует пользователей и группы."""
+        self.load(self.export())
+        self.assertEqual(User.objects.count(), 2)
+        self.assertEqual(Group.objects.count(), 1)
+        self.assertEqual(Post.objects.count(), 6)
+        self.assertEqual(Follow.objects.count(), 1)
+        self.assertEqual(
+            AuthorCounters.objects.get(user=self.author).posts_count, 6
+        )
+        self.assertEqual(self.group.posts.count(), 6)
+        self.assertEqual(
+            FeedItem.objects.filter(user=self.reader).count(), 6
+        )
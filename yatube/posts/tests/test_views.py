@@ -1,10 +1,20 @@
-from django.test import Client, TestCase
+import base64
+import json
+
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 from django import forms
-from ..models import Group, Post, User, Follow
+from ..models import Comment, FeedItem, Group, Post, User, Follow
 from ..forms import PostForm
+from ..pagination import page_window
+from ..views import Num_of_comments
+from .. import counts
+from django.utils import timezone
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
 
 class PostPagesTests(TestCase):
@@ -150,16 +160,46 @@ class PostPagesTests(TestCase):
     def test_index_page_cache(self):
         """Проверка кеширования index page"""
         first_response = self.authorized_client.get(reverse('posts:index'))
-        Post.objects.all().delete()
+        # update() не шлёт сигналов — фрагмент остаётся в кеше
+        Post.objects.update(text='Текст без сигнала')
         second_response = self.authorized_client.get(reverse('posts:index'))
         self.assertEqual(first_response.content, second_response.content)
         cache.clear()
         page_cleared = self.authorized_client.get(reverse('posts:index'))
         self.assertNotEqual(
-            first_response,
-            page_cleared
+            first_response.content,
+            page_cleared.content
         )
 
+    def test_fragment_cache_invalidated_by_changes(self):
+        """Изменение поста сразу сбрасывает фрагменты его страниц"""
+        pages = (
+            reverse('posts:index'),
+            reverse('posts:group_list', args=(self.group.slug,)),
+            reverse('posts:profile', args=(self.user.username,)),
+            reverse('posts:post_detail', args=(self.post.id,)),
+        )
+        for page in pages:
+            self.authorized_client.get(page)
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Новый текст поста'
+        post.save()
+        for page in pages:
+            with self.subTest(page=page):
+                response = self.authorized_client.get(page)
+                self.assertContains(response, 'Новый текст поста')
+
+    def test_new_comment_invalidates_post_detail(self):
+        """Новый комментарий сразу виден на странице поста"""
+        url = reverse('posts:post_detail', args=(self.post.id,))
+        self.authorized_client.get(url)
+        self.authorized_client.post(
+            reverse('posts:add_comment', args=(self.post.id,)),
+            {'text': 'Свежий комментарий'},
+        )
+        self.assertContains(self.authorized_client.get(url),
+                            'Свежий комментарий')
+
 
 class PaginatorViewsTest(TestCase):
     @classmethod
@@ -196,6 +236,163 @@ class PaginatorViewsTest(TestCase):
         response = self.author.get(reverse('posts:index') + '?page=2')
         self.assertEqual(len(response.context['page_obj']), 3)
 
+    def test_cursor_pages(self):
+        """Курсоры after/before листают ленту без пропусков и повторов"""
+        first = self.guest_client.get(reverse('posts:index'))
+        first_page = first.context['page_obj']
+        self.assertTrue(first_page.has_next())
+        self.assertFalse(first_page.has_previous())
+        response = self.guest_client.get(
+            reverse('posts:index'),
+            {'after': first_page.paginator.next_cursor}
+        )
+        second_page = response.context['page_obj']
+        self.assertEqual(len(second_page), 3)
+        self.assertFalse(second_page.has_next())
+        self.assertTrue(second_page.has_previous())
+        ids = [post.id for post in list(first_page) + list(second_page)]
+        self.assertEqual(
+            ids,
+            list(Post.objects.order_by('-pub_date', '-id')
+                 .values_list('id', flat=True))
+        )
+        response = self.guest_client.get(
+            reverse('posts:index'),
+            {'before': second_page.paginator.previous_cursor}
+        )
+        self.assertEqual(
+            list(response.context['page_obj']), list(first_page)
+        )
+
+    def test_page_window(self):
+        """Окно номеров: первая, последняя и соседи текущей"""
+        self.assertEqual(
+            page_window(10, 20), [1, None, 8, 9, 10, 11, 12, None, 20]
+        )
+        self.assertEqual(page_window(3, 4), [1, 2, 3, 4])
+        self.assertEqual(page_window(1, 1), [1])
+
+    def test_page_window_limited(self):
+        """Глубокие номера не становятся ссылками"""
+        self.assertEqual(
+            page_window(48, 200, limit=50),
+            [1, None, 46, 47, 48, 49, 50, None],
+        )
+        self.assertEqual(page_window(60, 200, limit=50), [1, None, 60, None])
+        self.assertEqual(
+            page_window(2, 200, limit=50), [1, 2, 3, 4, None]
+        )
+
+    def test_numbered_page_renders_window(self):
+        """Страница по номеру показывает окно номеров, по курсору — нет"""
+        response = self.author.get(reverse('posts:index'), {'page': 2})
+        self.assertEqual(response.context['page_obj'].paginator.window, [1, 2])
+        self.assertContains(response, '?page=1')
+        cursor = self.author.get(reverse('posts:index')).context[
+            'page_obj'].paginator.next_cursor
+        response = self.author.get(
+            reverse('posts:index'), {'after': cursor}
+        )
+        self.assertEqual(response.context['page_obj'].paginator.window, [])
+
+    def test_broken_cursor_returns_first_page(self):
+        """Испорченный курсор открывает первую страницу"""
+        response = self.guest_client.get(
+            reverse('posts:index'), {'after': 'not-a-cursor'}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['page_obj'].number, 1)
+
+    def test_crafted_cursors_and_pages_rejected(self):
+        """Подделанные курсоры и номера страниц не роняют страницу"""
+        def cursor(values):
+            raw = json.dumps(values).encode()
+            return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+        now = timezone.now().isoformat()
+        params = (
+            {'after': cursor([None, None])},
+            {'before': cursor([now, 10 ** 30])},
+            {'after': cursor([now, [1]])},
+            {'after': cursor({'a': 1})},
+            {'page': '99999999999999999999'},
+        )
+        post = Post.objects.filter(author=self.user).first()
+        pages = (
+            reverse('posts:index'),
+            reverse('posts:comments', args=(post.id,)),
+        )
+        for page in pages:
+            for query in params:
+                with self.subTest(page=page, query=query):
+                    response = self.guest_client.get(page, query)
+                    self.assertEqual(response.status_code, 200)
+        response = self.guest_client.get(
+            reverse('posts:index'), {'after': cursor([now, 10 ** 30])}
+        )
+        self.assertEqual(response.context['page_obj'].number, 1)
+
+    def test_pages_count_rows_with_limit_once(self):
+        """Списки считают записи с LIMIT и только при пустом кеше"""
+        pages = (
+            reverse('posts:index'),
+            reverse('posts:group_list', args=(self.group.slug,)),
+            reverse('posts:profile', args=(self.user.username,)),
+            reverse('posts:follow_index'),
+        )
+        for page in pages:
+            with self.subTest(page=page):
+                cache.clear()
+                # Профиль берёт число из счётчиков автора, а пустая
+                # лента подписок считает записи только на второй странице
+                with CaptureQueriesContext(connection) as queries:
+                    self.author.get(page)
+                    self.author.get(page + '?page=2')
+                counts = [
+                    query['sql'] for query in queries.captured_queries
+                    if 'COUNT(' in query['sql']
+                    and ('posts_post' in query['sql']
+                         or 'posts_feeditem' in query['sql'])
+                ]
+                for sql in counts:
+                    self.assertIn('LIMIT', sql)
+                with CaptureQueriesContext(connection) as queries:
+                    self.author.get(page + '?page=2')
+                self.assertFalse(
+                    [query for query in queries.captured_queries
+                     if 'COUNT(' in query['sql']]
+                )
+
+    def test_total_pages_shown(self):
+        """Пагинатор показывает число страниц"""
+        cache.clear()
+        response = self.author.get(reverse('posts:index'))
+        self.assertEqual(response.context['page_obj'].paginator.total,
+                         (13, True))
+        self.assertContains(response, 'всего 2 стр.')
+
+    @override_settings(COUNT_EXACT_LIMIT=5)
+    def test_total_estimated_past_limit(self):
+        """Сверх лимита число записей оценивается"""
+        cache.clear()
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        response = self.author.get(reverse('posts:index'))
+        total = response.context['page_obj'].paginator.total
+        self.assertFalse(total.exact)
+        self.assertEqual(total.value, 13)
+        self.assertContains(response, 'около 2 стр.')
+
+    def test_range_plans_not_estimated(self):
+        """Планы с диапазоном или полным просмотром не оцениваются"""
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        self.assertIsNotNone(counts.estimate(Post.objects.all()))
+        self.assertIsNone(counts.estimate(
+            Post.objects.filter(pub_date__gt=timezone.now())
+        ))
+        self.assertIsNone(counts.estimate(Post.objects.filter(text='Пост')))
+
 
 class FollowTests(TestCase):
     @classmethod
@@ -256,3 +453,204 @@ class FollowTests(TestCase):
         response = self.authorized_client.get(
             reverse('posts:follow_index'))
         self.assertNotIn(post, response.context['page_obj'])
+
+    def test_new_post_fans_out_to_followers(self):
+        """Новый пост попадает в ленты подписчиков автора."""
+        Follow.objects.create(user=self.follower, author=self.following)
+        post = Post.objects.create(
+            text='Пост для ленты', author=self.following
+        )
+        self.assertTrue(
+            FeedItem.objects.filter(user=self.follower, post=post).exists()
+        )
+
+    def test_unfollow_prunes_feed(self):
+        """Отписка убирает посты автора из ленты."""
+        Post.objects.create(text='Пост для ленты', author=self.following)
+        follow = Follow.objects.create(
+            user=self.follower, author=self.following
+        )
+        self.assertEqual(
+            FeedItem.objects.filter(user=self.follower).count(), 1
+        )
+        follow.delete()
+        self.assertFalse(FeedItem.objects.filter(user=self.follower).exists())
+
+    def test_follow_total_counts_feed(self):
+        """Лента считает свои записи и не пересчитывает их от чужих постов"""
+        other = User.objects.create_user(username='stranger')
+        Follow.objects.create(user=self.follower, author=self.following)
+        post = Post.objects.create(text='Пост', author=self.following)
+
+        def total():
+            response = self.authorized_client.get(
+                reverse('posts:follow_index')
+            )
+            return response.context['page_obj'].paginator.total
+
+        self.assertEqual(total(), (1, True))
+        Post.objects.create(text='Чужой пост', author=other)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(total(), (1, True))
+        self.assertFalse([query for query in queries.captured_queries
+                          if 'COUNT(' in query['sql']])
+        Post.objects.create(text='Ещё пост', author=self.following)
+        self.assertEqual(total(), (2, True))
+        post.delete()
+        self.assertEqual(total(), (1, True))
+
+    @override_settings(FEED_FANOUT_LIMIT=0)
+    def test_pulled_author_posts_in_follow_index(self):
+        """Посты авторов без раскладки дотягиваются в ленту при чтении."""
+        Follow.objects.create(user=self.follower, author=self.following)
+        cache.clear()
+        post = Post.objects.create(text='Пост без раскладки',
+                                   author=self.following)
+        self.assertFalse(FeedItem.objects.filter(post=post).exists())
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        self.assertIn(post, response.context['page_obj'])
+
+
+class CommentPaginationTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='commentator')
+        cls.post = Post.objects.create(text='Популярный пост', author=cls.user)
+        Comment.objects.bulk_create(
+            Comment(post=cls.post, author=cls.user, text=f'Комментарий {i}')
+            for i in range(Num_of_comments + 10)
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def test_first_page_and_fragment(self):
+        """На странице поста первая пачка, остальное — фрагментом."""
+        response = self.client.get(
+            reverse('posts:post_detail', args=(self.post.id,))
+        )
+        comments = response.context['comments']
+        self.assertEqual(len(comments), Num_of_comments)
+        self.assertEqual(comments[0].text, 'Комментарий 0')
+        self.assertTrue(comments.has_next())
+        fragment = self.client.get(
+            reverse('posts:comments', args=(self.post.id,)),
+            {'after': comments.paginator.next_cursor},
+        )
+        self.assertTemplateUsed(fragment, 'includes/comments.html')
+        self.assertEqual(len(fragment.context['comments']), 10)
+        self.assertContains(fragment, f'Комментарий {Num_of_comments + 9}')
+        self.assertNotContains(fragment, 'Показать ещё')
+
+    def test_add_comment_redirects_to_its_page(self):
+        """После комментария открывается страница, где он виден."""
+        response = self.client.post(
+            reverse('posts:add_comment', args=(self.post.id,)),
+            {'text': 'Свежий комментарий'},
+        )
+        comment = Comment.objects.get(text='Свежий комментарий')
+        url = reverse('posts:post_detail', args=(self.post.id,))
+        location, anchor = response['Location'].split('#')
+        self.assertEqual(anchor, f'comment-{comment.id}')
+        self.assertTrue(location.startswith(f'{url}?after='))
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(
+                reverse('posts:add_comment', args=(self.post.id,)),
+                {'text': 'Ещё комментарий'},
+            )
+        self.assertFalse([query for query in queries.captured_queries
+                          if 'COUNT(' in query['sql']
+                          and 'posts_comment' in query['sql']])
+        comments = self.client.get(location).context['comments']
+        self.assertEqual(comments[0], comment)
+
+    def test_first_comment_redirects_to_post(self):
+        """Первый комментарий поста открывает страницу без курсора."""
+        post = Post.objects.create(text='Новый пост', author=self.user)
+        response = self.client.post(
+            reverse('posts:add_comment', args=(post.id,)),
+            {'text': 'Первый'},
+        )
+        comment = Comment.objects.get(post=post)
+        url = reverse('posts:post_detail', args=(post.id,))
+        self.assertRedirects(
+            response, f'{url}#comment-{comment.id}',
+            fetch_redirect_response=False,
+        )
+
+
+class PostCardCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(
+            username='writer', first_name='Лев', last_name='Толстой'
+        )
+        cls.group = Group.objects.create(
+            title='Классика', slug='classic', description='Романы'
+        )
+        cls.post = Post.objects.create(
+            text='Все счастливые семьи', author=cls.user, group=cls.group
+        )
+        cls.other = Post.objects.create(
+            text='Другой пост', author=cls.user, group=cls.group
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def card_key(self, post):
+        post.refresh_from_db()
+        return make_template_fragment_key(
+            'post_card', [post.pk, post.updated_at]
+        )
+
+    def test_card_shared_between_feeds(self):
+        """Карточка, отрисованная в одной ленте, берётся из кеша в другой"""
+        self.client.get(reverse('posts:index'))
+        key = self.card_key(self.post)
+        self.assertIn('Все счастливые семьи', cache.get(key))
+        cache.set(key, 'карточка из кеша')
+        for page in (
+            reverse('posts:group_list', args=(self.group.slug,)),
+            reverse('posts:profile', args=(self.user.username,)),
+        ):
+            with self.subTest(page=page):
+                response = self.client.get(page)
+                self.assertContains(response, 'карточка из кеша')
+                self.assertContains(response, 'Другой пост')
+
+    def test_edit_renders_only_changed_card(self):
+        """Правка поста меняет ключ только его карточки"""
+        self.client.get(reverse('posts:index'))
+        post_key = self.card_key(self.post)
+        other_key = self.card_key(self.other)
+        self.client.post(
+            reverse('posts:edit', args=(self.post.id,)),
+            {'text': 'Каждая несчастливая семья', 'group': self.group.id},
+        )
+        self.assertNotEqual(self.card_key(self.post), post_key)
+        self.assertEqual(self.card_key(self.other), other_key)
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'Каждая несчастливая семья')
+        self.assertIsNotNone(cache.get(other_key))
+
+    def test_card_changes_visible(self):
+        """Комментарий и новое имя автора сдвигают ключ карточки"""
+        key = self.card_key(self.post)
+        Comment.objects.create(post=self.post, author=self.user, text='Да')
+        self.assertNotEqual(self.card_key(self.post), key)
+        key = self.card_key(self.post)
+        self.user.save(update_fields=['last_login'])
+        self.assertEqual(self.card_key(self.post), key)
+        self.user.first_name = 'Лев Николаевич'
+        self.user.save()
+        self.assertNotEqual(self.card_key(self.post), key)
+        self.assertContains(
+            self.client.get(reverse('posts:index')), 'Лев Николаевич'
+        )
@@ -0,0 +1,123 @@
+"""Фоновая подготовка миниатюр sorl-thumbnail.
+
+``{% thumbnail %}`` в шаблонах больше не декодирует и не масштабирует
+картинку внутри запроса: если миниатюры ещё нет в key-value store,
+``BackgroundThumbnailBackend`` ставит её в очередь пула потоков и
+отдаёт заглушку (ветка ``{% empty %}`` тега). Посты с новой картинкой
+ставятся в очередь сразу после сохранения, для всех геометрий из
+``POST_THUMBNAILS``. Когда миниатюры готовы, у постов сдвигаются
+``updated_at`` (ключ карточки) и поколения кеша, и закешированные
+карточки и страницы с заглушкой перерисовываются.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+from django.utils import timezone
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import DummyImageFile, ImageFile
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_pending = set()
+_lock = threading.Lock()
+
+
+def _failed_key(name):
+    return f'thumbnails:failed:{name}'
+
+
+def _get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails',
+            )
+        return _executor
+
+
+def generate(name):
+    """Построить все миниатюры картинки и обновить кеш её постов."""
+    from . import signals
+    from .models import Post
+
+    try:
+        for geometry, options in settings.POST_THUMBNAILS:
+            thumbnail = ThumbnailBackend.get_thumbnail(
+                default.backend, name, geometry, **options
+            )
+            if not thumbnail.exists():
+                raise FileNotFoundError(name)
+        # Карточка поста кешируется по updated_at, а не по поколениям
+        Post.objects.filter(image=name).update(updated_at=timezone.now())
+        for post in Post.objects.filter(image=name).only(
+            'id', 'author_id', 'group_id'
+        ):
+            signals.bump_post(post)
+    except Exception:
+        logger.exception('Не удалось подготовить миниатюры %s', name)
+        # Не повторять попытку на каждом показе страницы
+        cache.set(_failed_key(name), True, settings.THUMBNAIL_RETRY_TIMEOUT)
+    finally:
+        with _lock:
+            _pending.discard(name)
+        close_old_connections()
+
+
+def schedule(name):
+    """Поставить картинку в очередь; без пула потоков — сразу."""
+    if not name or cache.get(_failed_key(name)):
+        return
+    if not default.storage.exists(name):
+        # Битая ссылка на файл: строить нечего
+        cache.set(_failed_key(name), True, settings.THUMBNAIL_RETRY_TIMEOUT)
+        return
+    if not settings.THUMBNAIL_WORKERS:
+        generate(name)
+        return
+    with _lock:
+        if name in _pending:
+            return
+        _pending.add(name)
+    _get_executor().submit(generate, name)
+
+
+class BackgroundThumbnailBackend(ThumbnailBackend):
+    """Отдаёт только готовые миниатюры, остальные строит в фоне."""
+
+    def get_ready_thumbnail(self, file_, geometry_string, **options):
+        # Имя миниатюры вычисляется так же, как в ThumbnailBackend
+        source = ImageFile(file_)
+        if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(thumbnail_settings, attr)
+            if value != getattr(default_settings, attr):
+                options.setdefault(key, value)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return default.kvstore.get(ImageFile(name, default.storage))
+
+    def get_thumbnail(self, file_, geometry_string, **options):
+        if not file_:
+            raise ValueError('falsey file_ argument in get_thumbnail()')
+        thumbnail = self.get_ready_thumbnail(
+            file_, geometry_string, **options
+        )
+        if thumbnail:
+            return thumbnail
+        schedule(getattr(file_, 'name', file_))
+        return (
+            self.get_ready_thumbnail(file_, geometry_string, **options)
+            or DummyImageFile(geometry_string)
+        )
@@ -0,0 +1,195 @@
+"""Перенос данных между окружениями в формате NDJSON.
+
+Каждая строка — одна запись: ``{"model": "post", "id": 1, "fields": {...}}``.
+Экспорт идёт по моделям в порядке зависимостей и читает таблицы
+чанками через ``iterator()``, поэтому память не зависит от объёма.
+Импорт держит в памяти только текущую пачку: записи вставляются
+``bulk_create`` в отдельной транзакции на пачку, сигналы не вызываются.
+
+Первичные ключи переназначаются сдвигом: новый id равен старому плюс
+максимальный id этой модели в базе до импорта. Пользователи и группы,
+которые уже есть в базе (то же имя или slug), не создаются заново —
+только их id запоминаются отдельно. Производные данные (счётчики,
+поисковый индекс, ленты подписок) пересчитываются после вставки:
+ленты здесь, счётчики и индекс — командами ``repair_counters`` и
+``rebuild_search_index``.
+"""
+import json
+import time
+from contextlib import contextmanager
+
+from django.contrib.auth import get_user_model
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max, Q
+
+from . import counts, feed, generations
+from .models import Comment, Follow, Group, Post
+from .pagination import CursorEncoder
+
+User = get_user_model()
+
+# Модель, её поля и внешние ключи (поле -> модель) в порядке загрузки
+MODELS = (
+    ('user', User, (
+        'username', 'first_name', 'last_name', 'email', 'password',
+        'is_staff', 'is_active', 'is_superuser', 'last_login',
+        'date_joined',
+    ), {}),
+    ('group', Group, ('title', 'slug', 'description'), {}),
+    ('post', Post, ('text', 'pub_date', 'author', 'group', 'image'), {
+        'author': 'user', 'group': 'group',
+    }),
+    ('comment', Comment, ('post', 'author', 'text', 'created'), {
+        'post': 'post', 'author': 'user',
+    }),
+    ('follow', Follow, ('user', 'author'), {
+        'user': 'user', 'author': 'user',
+    }),
+)
+# Как часто, в секундах, сообщать о ходе импорта
+PROGRESS_INTERVAL = 5
+# Естественные ключи: такие записи сливаются с уже существующими
+NATURAL_KEYS = {'user': 'username', 'group': 'slug'}
+
+
+def export(stream, chunk_size=2000):
+    """Записать все модели в ``stream``; вернуть число строк по моделям."""
+    totals = {}
+    for name, model, fields, _ in MODELS:
+        rows = (
+            model.objects.order_by('pk').values_list('pk', *fields)
+            .iterator(chunk_size=chunk_size)
+        )
+        count = 0
+        for pk, *values in rows:
+            stream.write(json.dumps(
+                {'model': name, 'id': pk, 'fields': dict(zip(fields, values))},
+                cls=CursorEncoder,
+                ensure_ascii=False,
+            ) + '\n')
+            count += 1
+        totals[name] = count
+    return totals
+
+
+@contextmanager
+def keep_dates(*models):
+    """Сохранять даты из файла вместо времени импорта.
+
+    Флаг ``auto_now_add`` снимается с полей моделей, общих для всего
+    процесса: пока блок открыт, посты, сохранённые в других потоках,
+    тоже остались бы без даты. Только для команд импорта.
+    """
+    fields = [
+        field for model in models for field in model._meta.fields
+        if getattr(field, 'auto_now_add', False)
+    ]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+class Importer:
+    """Потоковая загрузка NDJSON с переназначением ключей."""
+
+    def __init__(self, batch_size=2000, progress=None):
+        self.batch_size = batch_size
+        self.progress = progress
+        self.specs = {name: spec for name, *spec in MODELS}
+        self.shift = {
+            name: model.objects.aggregate(last=Max('pk'))['last'] or 0
+            for name, model, *_ in MODELS
+        }
+        self.merged = {name: {} for name in self.specs}
+        self.totals = {name: 0 for name in self.specs}
+        self.started = self.reported = time.monotonic()
+
+    def new_id(self, name, old):
+        if old is None:
+            return None
+        return self.merged[name].get(old, old + self.shift[name])
+
+    def run(self, lines):
+        batch, current = [], None
+        with keep_dates(Post, Comment):
+            for line in lines:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if record['model'] != current or len(batch) >= self.batch_size:
+                    self.flush(current, batch)
+                    batch, current = [], record['model']
+                batch.append(record)
+            self.flush(current, batch)
+        if current:
+            self.report(current, force=True)
+        self.finish()
+        return self.totals
+
+    @transaction.atomic
+    def flush(self, name, batch):
+        if not batch:
+            return
+        model, fields, foreign = self.specs[name]
+        key = NATURAL_KEYS.get(name)
+        if key:
+            existing = dict(
+                model.objects.filter(
+                    **{f'{key}__in': [r['fields'][key] for r in batch]}
+                ).values_list(key, 'pk')
+            )
+            for record in batch:
+                pk = existing.get(record['fields'][key])
+                if pk is not None:
+                    self.merged[name][record['id']] = pk
+            batch = [r for r in batch if r['fields'][key] not in existing]
+        objects = []
+        for record in batch:
+            values = {}
+            for field in fields:
+                value = record['fields'].get(field)
+                if field in foreign:
+                    values[f'{field}_id'] = self.new_id(foreign[field], value)
+                else:
+                    values[field] = value
+            objects.append(model(pk=self.new_id(name, record['id']), **values))
+        model.objects.bulk_create(objects, ignore_conflicts=name == 'follow')
+        self.totals[name] += len(objects)
+        self.report(name)
+
+    def report(self, name, force=False):
+        now = time.monotonic()
+        if not self.progress or (
+            not force and now - self.reported < PROGRESS_INTERVAL
+        ):
+            return
+        self.reported = now
+        done = sum(self.totals.values())
+        self.progress(
+            f'{name}: {self.totals[name]}, всего {done} '
+            f'({done / max(now - self.started, 1e-6):.0f} строк/с)'
+        )
+
+    def finish(self):
+        # Вставка с явными id не двигает последовательности PostgreSQL
+        models = [model for _, model, *_ in MODELS]
+        statements = connection.ops.sequence_reset_sql(no_style(), models)
+        with transaction.atomic(), connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
+            # Новые посты слитых авторов нужны и их прежним подписчикам
+            feed.fill(Follow.objects.filter(
+                Q(pk__gt=self.shift['follow'])
+                | Q(author_id__in=self.merged['user'].values())
+            ))
+        # Оценки числа записей в списках опираются на эту статистику
+        counts.analyze()
+        generations.bump(
+            *(generations.author(pk) for pk in self.merged['user'].values()),
+            *(generations.group(pk) for pk in self.merged['group'].values())
+        )
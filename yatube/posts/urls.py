@@ -11,8 +11,16 @@ urlpatterns = [
     path('group/<slug:slug>/', views.group_posts, name='group_list'),
     # Профайл пользователя
     path('profile/<str:username>/', views.profile, name='profile'),
+    # Поиск по тексту постов
+    path('search/', views.post_search, name='search'),
     # Просмотр записи
     path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
+    # Следующая страница комментариев (фрагмент для подгрузки)
+    path(
+        'posts/<int:post_id>/comments/',
+        views.post_comments,
+        name='comments'
+    ),
     # Создание записи
     path('create/', views.post_create, name='create'),
     # Редактирование записи
@@ -1,67 +1,199 @@
-from .models import Post, Group, User, Follow
+from .models import Comment, Post, Follow
 from django.shortcuts import render, get_object_or_404, redirect
-from django.core.paginator import Paginator
 from django.contrib.auth.decorators import login_required
+from django.db import transaction
+from django.db.models import Q
+from django.urls import reverse
+from django.utils.http import urlencode
 from .forms import PostForm, CommentForm
+from . import counts, feed, generations, lookups, search, thumbnails
+from .counters import counters_for
+from .feed import FeedPaginator
+from .page_cache import cache_anonymous_page
+from .pagination import KeysetPaginator
 
 Num_of_page = 10  # Количество постов на страницу
 Num_of_post = 30  # Количество символов названия поста
+Num_of_comments = 50  # Количество комментариев на страницу
 
 
-def paginator(request, post_list):
-    paginator = Paginator(post_list, Num_of_page)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+def paginator(request, post_list,
+              paginator_class=KeysetPaginator, per_page=Num_of_page,
+              **kwargs):
+    paginator = paginator_class(post_list, per_page, **kwargs)
+    page_obj = paginator.get_cursor_page(
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+        number=request.GET.get('page'),
+    )
     return page_obj
 
 
+def index_state(request):
+    return (generations.POSTS,)
+
+
+def group_state(request, slug):
+    group = lookups.group(slug)
+    if group is None:
+        return None
+    return (generations.group(group.id),)
+
+
+def profile_state(request, username):
+    author = lookups.user(username)
+    if author is None:
+        return None
+    return (generations.author(author.id),)
+
+
+def post_state(request, post_id):
+    # Рядом с постом выводятся имя и счётчики автора
+    author_id = Post.objects.filter(id=post_id).values_list(
+        'author_id', flat=True
+    ).first()
+    if author_id is None:
+        return None
+    return (generations.post(post_id), generations.author(author_id))
+
+
+@cache_anonymous_page(index_state)
 def index(request):
-    post_list = Post.objects.all().order_by('-pub_date')
-    page_obj = paginator(request, post_list)
+    post_list = Post.objects.select_related('author', 'group').cached()
+    page_obj = paginator(
+        request, post_list,
+        counter=lambda: counts.total(post_list, generations.POSTS),
+    )
     context = {
         'page_obj': page_obj,
+        'generation': generations.stamp(generations.POSTS),
     }
     return render(request, 'posts/index.html', context)
 
 
+@cache_anonymous_page(group_state)
 def group_posts(request, slug):
-    group = get_object_or_404(Group, slug=slug)
-    post_list = group.posts.all().order_by('-pub_date')
-    page_obj = paginator(request, post_list)
+    group = lookups.group_or_404(slug)
+    post_list = group.posts.select_related('author', 'group').cached()
+    page_obj = paginator(
+        request, post_list,
+        counter=lambda: counts.total(
+            post_list, generations.group(group.id)
+        ),
+    )
     context = {
         'group': group,
         'page_obj': page_obj,
+        'generation': generations.stamp(generations.group(group.id)),
     }
     return render(request, 'posts/group_list.html', context)
 
 
+@cache_anonymous_page(profile_state)
 def profile(request, username):
     # Здесь код запроса к модели и создание словаря контекста
-    author = get_object_or_404(User, username=username)
-    post_list = author.posts.all()
-    page_obj = paginator(request, post_list)
+    author = lookups.user_or_404(username)
+    post_list = author.posts.select_related('author', 'group').cached()
+    counters = counters_for(author)
+    # Денормализованный счётчик точен и уже выбран вместе с автором
+    page_obj = paginator(
+        request, post_list,
+        counter=lambda: counts.Total(counters.posts_count, True),
+    )
     context = {
         'author': author,
+        'counters': counters,
         'page_obj': page_obj,
+        'generation': generations.stamp(generations.author(author.id)),
     }
     return render(request, 'posts/profile.html', context)
 
 
+@cache_anonymous_page(post_state)
 def post_detail(request, post_id):
     # Здесь код запроса к модели и создание словаря контекста
-    post = get_object_or_404(Post, id=post_id)
+    post = get_object_or_404(
+        Post.objects.select_related('author__counters', 'group'),
+        id=post_id,
+    )
     form = CommentForm(
         request.POST or None,
     )
-    comments = post.comments.all()
     context = {
         'post': post,
+        'counters': counters_for(post.author),
         'form': form,
-        'comments': comments,
+        'comments': comments_page(request, post.id),
+        'generation': generations.stamp(generations.post(post.id)),
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+def comments_page(request, post_id):
+    # Комментарии листаются курсором по индексу (post, created, id)
+    comment_list = Comment.objects.filter(
+        post_id=post_id
+    ).select_related('author')
+    return paginator(
+        request, comment_list, per_page=Num_of_comments,
+        ordering=('created', 'id'),
+    )
+
+
+@cache_anonymous_page(post_state)
+def post_comments(request, post_id):
+    # Следующая пачка комментариев для подгрузки на странице поста
+    post = get_object_or_404(Post.objects.only('id'), id=post_id)
+    context = {
+        'post': post,
+        'comments': comments_page(request, post.id),
+        'fragment': True,
+    }
+    return render(request, 'includes/comments.html', context)
+
+
+def comment_url(comment):
+    """Адрес страницы поста, которая начинается с комментария."""
+    # Курсор предыдущего комментария: одна строка по индексу
+    # (post, created, id) вместо COUNT и OFFSET до нужной страницы
+    previous = Comment.objects.filter(
+        Q(created__lt=comment.created)
+        | Q(created=comment.created, id__lt=comment.id),
+        post_id=comment.post_id,
+    ).order_by('-created', '-id').only('created', 'id').first()
+    url = reverse('posts:post_detail', args=(comment.post_id,))
+    if previous is not None:
+        cursor = KeysetPaginator(
+            Comment.objects.none(), Num_of_comments,
+            ordering=('created', 'id'),
+        ).encode_cursor(previous)
+        url += '?' + urlencode({'after': cursor})
+    return f'{url}#comment-{comment.id}'
+
+
+@cache_anonymous_page(index_state)
+def post_search(request):
+    query = request.GET.get('q', '').strip()
+    post_list = search.ranked(
+        Post.objects.select_related('author', 'group'), query
+    )
+    page_obj = paginator(request, post_list, ordering=('rank', 'id'))
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+        # Ссылки пагинатора сохраняют поисковый запрос
+        'pager_query': urlencode({'q': query}) + '&',
+    }
+    return render(request, 'posts/search.html', context)
+
+
+def schedule_thumbnails(form):
+    # Миниатюры новой картинки готовятся в фоне после коммита
+    if 'image' in form.changed_data and form.instance.image:
+        name = form.instance.image.name
+        transaction.on_commit(lambda: thumbnails.schedule(name))
+
+
 @login_required
 def post_create(request):
     # Создание поста
@@ -73,6 +205,7 @@ def post_create(request):
         create_post = form.save(commit=False)
         create_post.author = request.user
         form.save()
+        schedule_thumbnails(form)
         return redirect('posts:profile', username=request.user)
 
     context = {
@@ -86,7 +219,7 @@ def post_edit(request, post_id):
     # Редактирование поста
     post = get_object_or_404(Post, id=post_id)
     is_edit = True
-    if request.user != post.author:
+    if request.user.id != post.author_id:
         return redirect('posts:post_detail', post_id=post.id)
 
     form = PostForm(
@@ -95,7 +228,8 @@ def post_edit(request, post_id):
         instance=post,
     )
     if form.is_valid():
-        form = form.save()
+        form.save()
+        schedule_thumbnails(form)
         return redirect('posts:post_detail', post_id=post.id)
 
     context = {
@@ -114,22 +248,30 @@ def add_comment(request, post_id):
         comment.author = request.user
         comment.post = post
         comment.save()
+        return redirect(comment_url(comment))
     return redirect('posts:post_detail', post_id=post_id)
 
 
 @login_required
 def follow_index(request):
-    post_list = Post.objects.select_related('author').filter(
-        author__following__user=request.user
+    post_list = Post.objects.filter(author__following__user=request.user)
+    page_obj = paginator(
+        request, post_list, FeedPaginator, reader=request.user,
+        counter=lambda: feed.total(request.user),
     )
-    page_obj = paginator(request, post_list)
-    return render(request, 'posts/follow.html', {'page_obj': page_obj})
+    context = {
+        'page_obj': page_obj,
+        'generation': generations.stamp(
+            generations.POSTS, generations.follow(request.user.id)
+        ),
+    }
+    return render(request, 'posts/follow.html', context)
 
 
 @login_required
 def profile_follow(request, username):
     if username != request.user.username:
-        author = get_object_or_404(User, username=username)
+        author = lookups.user_or_404(username)
         Follow.objects.get_or_create(
             user=request.user,
             author=author,
@@ -139,9 +281,10 @@ def profile_follow(request, username):
 
 @login_required
 def profile_unfollow(request, username):
+    author = lookups.user_or_404(username)
     follower = get_object_or_404(
         Follow,
         user=request.user,
-        author__username=username)
+        author=author)
     follower.delete()
     return redirect('posts:profile', username)
@@ -52,12 +52,14 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'debug_toolbar.middleware.DebugToolbarMiddleware',  # Добавленное
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.ReplicaPinMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.ServerTimingMiddleware',
 ]
 
 ROOT_URLCONF = 'yatube.urls'
@@ -91,6 +93,7 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'CONN_MAX_AGE': 60,
     }
 }
 
@@ -148,12 +151,146 @@ CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Рабочие файлы приложения (кеши): каталог только пользователя, от
+# которого запущен сайт, а не общий /tmp
+RUN_DIR = os.environ.get('YATUBE_RUN_DIR', os.path.join(BASE_DIR, 'var'))
+
+# Общий для всех воркеров хоста кеш в отображённом в память файле
+# (см. core.cache); у тестов свой кеш в памяти (yatube.settings_test).
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+        'BACKEND': 'core.cache.MmapCache',
+        'LOCATION': os.path.join(RUN_DIR, 'cache'),
+        'OPTIONS': {
+            'SIZE': 64 * 1024 * 1024,
+            'SLOTS': 16384,
+        },
+    },
+    # Результаты запросов ORM (posts.querycache) вытесняются отдельно
+    # от фрагментов страниц; SIZE — потолок памяти под них, MAX_ENTRY —
+    # под один результат
+    'queryset': {
+        'BACKEND': 'core.cache.MmapCache',
+        'LOCATION': os.path.join(RUN_DIR, 'queryset'),
+        'OPTIONS': {
+            'SIZE': 32 * 1024 * 1024,
+            'SLOTS': 16384,
+            'MAX_ENTRY': 256 * 1024,
+        },
+    },
 }
 
 INTERNAL_IPS = [
     '127.0.0.1',
 ]
+
+# Лента подписок: посты авторов, у которых подписчиков больше лимита,
+# не раскладываются по лентам, а дотягиваются при чтении.
+FEED_FANOUT_LIMIT = 1000
+FEED_BACKFILL_LIMIT = 1000
+FEED_BATCH_SIZE = 500
+FEED_PULLED_AUTHORS_TIMEOUT = 300
+
+# Страницы для анонимных читателей хранятся в кеше до смены поколения
+ANONYMOUS_PAGE_CACHE_TIMEOUT = 60 * 60 * 6
+
+# Миниатюры строятся в фоновом пуле потоков; до готовности шаблоны
+# показывают заглушку. Геометрии совпадают с {% thumbnail %} в шаблонах.
+THUMBNAIL_BACKEND = 'posts.thumbnails.BackgroundThumbnailBackend'
+THUMBNAIL_WORKERS = 2
+THUMBNAIL_RETRY_TIMEOUT = 60 * 60
+POST_THUMBNAILS = [
+    ('960x339', {'crop': 'center', 'upscale': True}),
+]
+
+# Загруженные картинки постов уменьшаются и перекодируются без EXIF;
+# маленькие картинки без метаданных сохраняются как есть. Не-JPEG
+# декодируются целиком: POST_IMAGE_MAX_PIXELS ограничивает и память.
+POST_IMAGE_MAX_SIZE = (1920, 1920)
+POST_IMAGE_MAX_PIXELS = 50_000_000
+POST_IMAGE_QUALITY = 82
+POST_IMAGE_PASSTHROUGH_BYTES = 200 * 1024
+
+# Кеш результатов запросов ORM (posts.querycache): время жизни и
+# модели, чьи таблицы не кешируются (например, 'posts.Comment')
+QUERYSET_CACHE_TIMEOUT = 60 * 10
+QUERYSET_CACHE_EXCLUDE = []
+
+# Сколько секунд кешируются найденные по адресу группы и пользователи
+# и сколько — адреса, по которым ничего нет (posts.lookups)
+LOOKUP_CACHE_TIMEOUT = 60 * 60
+LOOKUP_NEGATIVE_TIMEOUT = 60
+
+# Защита от лавины пересчётов (core.stampede): сколько секунд после
+# срока отдаётся прежнее значение, сколько живёт блокировка пересчёта и
+# сколько ждут первого расчёта остальные запросы
+STAMPEDE_GRACE = 60
+STAMPEDE_LOCK_TIMEOUT = 30
+STAMPEDE_WAIT = 5
+
+# Списки считают записи точно до этого числа, дальше — оценка
+# планировщика (см. posts.counts); результат живёт в кеше до записи
+COUNT_EXACT_LIMIT = 10000
+COUNT_CACHE_TIMEOUT = 60 * 60
+
+# Поиск учитывает не больше стольких слов запроса
+SEARCH_MAX_TERMS = 10
+
+# Заголовок Server-Timing и строка журнала core.timing на каждый запрос;
+# False полностью отключает middleware.
+SERVER_TIMING = True
+
+# Сводные метрики для Prometheus на /metrics/ (только для staff).
+# Воркеры складывают снимки в общий каталог; снимки завершившихся
+# процессов складываются в один файл.
+METRICS = True
+METRICS_DIR = os.path.join(RUN_DIR, 'metrics')
+METRICS_FLUSH_INTERVAL = 5
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'core.timing': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+        'posts.images': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
+# Реплики для чтения: пути к копиям SQLite через запятую в YATUBE_REPLICAS
+# (копии обновляет команда sync_replicas). После записи браузер читает
+# из основной базы ещё REPLICA_PIN_SECONDS секунд.
+DATABASE_REPLICAS = []
+for number, path in enumerate(
+    filter(None, os.environ.get('YATUBE_REPLICAS', '').split(','))
+):
+    DATABASES[f'replica{number}'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': path,
+        'CONN_MAX_AGE': 60,
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica{number}')
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+REPLICA_PIN_SECONDS = 10
+
+# PRAGMA для каждого нового соединения SQLite (см. core.db): WAL, чтобы
+# чтение не ждало записи, ожидание блокировки вместо «database is
+# locked», отображение файла в память и кеш страниц (в КиБ при минусе).
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,
+}
@@ -0,0 +1,26 @@
+"""Настройки для тестов (manage.py test и pytest).
+
+Кеши живут в памяти процесса, чтобы тесты не читали и не чистили кеш
+запущенного сервера; миниатюры строятся сразу, так как фоновые потоки
+пережили бы очистку базы и временного MEDIA_ROOT; метрики не пишутся
+на диск, а журнал замеров не засоряет вывод.
+"""
+from .settings import *  # noqa: F401,F403
+from .settings import LOGGING
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'queryset': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'queryset',
+        'OPTIONS': {'MAX_ENTRIES': 1000},
+    },
+}
+
+THUMBNAIL_WORKERS = 0
+
+METRICS_DIR = None
+
+LOGGING['loggers']['core.timing']['level'] = 'WARNING'